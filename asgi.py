@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+import os
+import re
+import io
+import sys
+import json
+import asyncio
+import mimetypes
+from pathlib import Path
+from email.utils import formatdate
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple, Callable, Awaitable
+
+from flask.sessions import SecureCookieSession
+from itsdangerous import BadSignature
+from werkzeug.http import dump_cookie, parse_options_header
+from werkzeug.formparser import FormDataParser
+
+import webapp
+
+CHUNK_SIZE = 64 * 1024
+# Flag submissions are a few short fields; anything bigger is refused before it is read
+MAX_FORM_BODY = 64 * 1024
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+def _content_disposition(filename: str) -> str:
+    """Attachment header the way send_file writes it, with an RFC 5987 name for non-ASCII files"""
+    try:
+        filename.encode("ascii")
+        return f'attachment; filename="{filename}"'
+    except UnicodeEncodeError:
+        fallback = filename.encode("ascii", "ignore").decode() or "download"
+        return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+#ASGI app that serves flag submission and downloads on an event loop and runs every other route through Flask
+class AsyncGateway:
+    def __init__(self, flask_app, db_threads: int = 16, wsgi_threads: int = 32, chunk_size: int = CHUNK_SIZE):
+        self.flask_app = flask_app
+        self.chunk_size = chunk_size
+        # Flag checks, SQLite queries and file reads block, so they run here; the bound keeps
+        # a burst of requests from opening hundreds of database connections at once
+        self.executor = ThreadPoolExecutor(max_workers=db_threads, thread_name_prefix="ctf-asgi")
+        # Every other route runs the Flask app in its own pool, so long responses such as
+        # /events streams never take threads from the native routes or from each other
+        self.wsgi_executor = ThreadPoolExecutor(max_workers=wsgi_threads, thread_name_prefix="ctf-wsgi")
+        self.serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        self.routes: List[Tuple[str, "re.Pattern[str]", Callable]] = [
+            ("POST", re.compile(r"^/submit_flag$"), self.submit_flag),
+            ("GET", re.compile(r"^/download/(?P<challenge_id>[^/]+)/(?P<filename>[^/]+)$"), self.download_challenge_file),
+            ("GET", re.compile(r"^/custom_file/(?P<challenge_id>[^/]+)/(?P<filename>[^/]+)$"), self.serve_custom_file),
+        ]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] == "http":
+            method = "GET" if scope["method"] == "HEAD" else scope["method"]
+            for route_method, pattern, handler in self.routes:
+                match = pattern.match(scope["path"])
+                if match and route_method == method:
+                    self._start_background()
+                    await handler(scope, receive, send, **match.groupdict())
+                    return
+        await self._delegate(scope, receive, send)
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        """Start the per-process background workers, and flush the submission log on shutdown"""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._start_background()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.run(webapp.submission_log.flush)
+                self.executor.shutdown(wait=False)
+                self.wsgi_executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _start_background(self) -> None:
+        """Same threads the Flask before_request hook starts; each start() is a no-op once running"""
+        webapp.invalidation_bus.start()
+        webapp.submission_log.start()
+
+    async def run(self, func: Callable, *args: Any) -> Any:
+        """Run blocking work in the bounded pool without holding up the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def _delegate(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Serve a request through the Flask app, running it in the WSGI thread pool"""
+        if scope["type"] != "http":
+            return
+        limit = self.flask_app.config.get("MAX_CONTENT_LENGTH")
+        body = io.BytesIO()
+        while True:
+            message = await receive()
+            body.write(message.get("body", b""))
+            if limit and body.tell() > limit:
+                await self._respond(send, 413, b"Request body too large\n", "text/plain; charset=utf-8")
+                return
+            if not message.get("more_body"):
+                break
+        body.seek(0)
+
+        environ = self._environ(scope, body)
+        loop = asyncio.get_running_loop()
+
+        def forward(message: Dict[str, Any]) -> None:
+            # Waits until the loop has sent the message, so a slow client slows this response only
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def serve() -> None:
+            # One thread runs the whole response: Flask's request context lives in a context variable,
+            # so a streamed response must be iterated on the thread that started it
+            response: Dict[str, Any] = {}
+
+            def start_response(status: str, headers: List[Tuple[str, str]], exc_info=None):
+                response["status"] = int(status.split(" ", 1)[0])
+                response["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                                       for name, value in headers]
+
+            result = self.flask_app(environ, start_response)
+            try:
+                started = False
+                for chunk in result:
+                    # start_response may be deferred until the first chunk
+                    if not started:
+                        forward({"type": "http.response.start", "status": response["status"], "headers": response["headers"]})
+                        started = True
+                    if chunk:
+                        forward({"type": "http.response.body", "body": chunk, "more_body": True})
+                if not started:
+                    forward({"type": "http.response.start", "status": response["status"], "headers": response["headers"]})
+                forward({"type": "http.response.body", "body": b""})
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+
+        await loop.run_in_executor(self.wsgi_executor, serve)
+
+    def _environ(self, scope: Scope, body: io.BytesIO) -> Dict[str, Any]:
+        """WSGI environ for an ASGI HTTP scope"""
+        server = scope.get("server") or ("localhost", 80)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+            "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+            "SERVER_NAME": str(server[0]),
+            "SERVER_PORT": str(server[1]),
+            "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": body,
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False,
+        }
+        for name, value in scope["headers"]:
+            name = name.decode("latin-1").upper().replace("-", "_")
+            value = value.decode("latin-1")
+            if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                key = name
+            else:
+                key = f"HTTP_{name}"
+            if key in environ:
+                value = environ[key] + ("; " if key == "HTTP_COOKIE" else ",") + value
+            environ[key] = value
+        return environ
+
+    # Sessions are Flask's signed cookies, read and written with the app's own settings
+
+    def _load_session(self, scope: Scope) -> SecureCookieSession:
+        """The Flask session carried by a request, empty when missing or tampered with"""
+        interface = self.flask_app.session_interface
+        name = interface.get_cookie_name(self.flask_app).encode()
+        for header, value in scope["headers"]:
+            if header != b"cookie":
+                continue
+            for part in value.split(b";"):
+                key, _, cookie = part.strip().partition(b"=")
+                if key == name and cookie:
+                    try:
+                        data = self.serializer.loads(cookie.decode("latin-1"),
+                                                     max_age=int(self.flask_app.permanent_session_lifetime.total_seconds()))
+                        return SecureCookieSession(data)
+                    except BadSignature:
+                        return SecureCookieSession()
+        return SecureCookieSession()
+
+    def _session_cookie(self, session: SecureCookieSession) -> Tuple[bytes, bytes]:
+        """Set-Cookie header for an updated session"""
+        app = self.flask_app
+        interface = app.session_interface
+        cookie = dump_cookie(
+            interface.get_cookie_name(app), self.serializer.dumps(dict(session)),
+            expires=interface.get_expiration_time(app, session),
+            domain=interface.get_cookie_domain(app), path=interface.get_cookie_path(app),
+            secure=interface.get_cookie_secure(app), httponly=interface.get_cookie_httponly(app),
+            samesite=interface.get_cookie_samesite(app),
+        )
+        return b"set-cookie", cookie.encode("latin-1")
+
+    # Responses
+
+    async def _respond(self, send: Send, status: int, body: bytes, content_type: str,
+                       headers: Optional[List[Tuple[bytes, bytes]]] = None) -> None:
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", content_type.encode()),
+                                (b"content-length", str(len(body)).encode())] + (headers or [])})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _json(self, send: Send, data: Dict[str, Any], headers: Optional[List[Tuple[bytes, bytes]]] = None) -> None:
+        await self._respond(send, 200, (json.dumps(data, separators=(",", ":")) + "\n").encode(), "application/json", headers)
+
+    async def _redirect(self, scope: Scope, send: Send, location: str) -> None:
+        await self._respond(send, 302, b"", "text/html; charset=utf-8",
+                            [(b"location", (scope.get("root_path", "") + location).encode())])
+
+    async def _send_file(self, scope: Scope, send: Send, path: Path, download_name: str) -> None:
+        """Stream a file as an attachment, reading each chunk in the pool"""
+        try:
+            f = await self.run(open, path, "rb")
+        except OSError:
+            await self._respond(send, 404, b"File not found\n", "text/plain; charset=utf-8")
+            return
+        try:
+            stat = os.fstat(f.fileno())
+            content_type = mimetypes.guess_type(download_name)[0] or "application/octet-stream"
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", content_type.encode()),
+                (b"content-length", str(stat.st_size).encode()),
+                (b"content-disposition", _content_disposition(download_name).encode("latin-1")),
+                (b"last-modified", formatdate(stat.st_mtime, usegmt=True).encode()),
+                (b"cache-control", b"no-cache"),
+            ]})
+            if scope["method"] == "HEAD":
+                await send({"type": "http.response.body", "body": b""})
+                return
+            # A slow reader only holds this coroutine; the pool thread is free again after each chunk
+            while True:
+                chunk = await self.run(f.read, self.chunk_size)
+                if not chunk:
+                    break
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            f.close()
+
+    async def _read_form(self, scope: Scope, receive: Receive) -> Optional[Dict[str, str]]:
+        """Parse an urlencoded or multipart body; None when it is larger than MAX_FORM_BODY"""
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        declared = headers.get("content-length", "")
+        if declared.isdigit() and int(declared) > MAX_FORM_BODY:
+            return None
+        body = io.BytesIO()
+        while True:
+            message = await receive()
+            body.write(message.get("body", b""))
+            if body.tell() > MAX_FORM_BODY:
+                return None
+            if not message.get("more_body"):
+                break
+        mimetype, options = parse_options_header(headers.get("content-type", ""))
+        size = body.tell()
+        body.seek(0)
+        _, form, _ = FormDataParser(max_content_length=MAX_FORM_BODY).parse(body, mimetype, size, options)
+        return form
+
+    # Native routes, mirroring the Flask views of the same names
+
+    async def submit_flag(self, scope: Scope, receive: Receive, send: Send) -> None:
+        session = self._load_session(scope)
+        form = await self._read_form(scope, receive)
+        if form is None:
+            await self._respond(send, 413, b"Request body too large\n", "text/plain; charset=utf-8")
+            return
+        if "user" not in session:
+            await self._json(send, {"success": False, "message": "Not logged in"})
+            return
+
+        challenge_id = form.get("challenge_id")
+        challenge_type = form.get("challenge_type", "generated")
+        submitted_flag = form.get("flag")
+        if not challenge_id or not submitted_flag:
+            await self._json(send, {"success": False, "message": "Missing challenge or flag"})
+            return
+        is_correct, session_key = await self.run(webapp.record_flag_attempt, session["user"], challenge_id,
+                                                 challenge_type, submitted_flag)
+        if not is_correct:
+            await self._json(send, {"success": False, "message": "Incorrect flag. Try again!"})
+            return
+
+        # Mark challenge as solved
+        solved = dict(session.get("solved_challenges", {}))
+        solved[session_key] = True
+        session["solved_challenges"] = solved
+        await self._json(send, {"success": True, "message": "Correct flag! Challenge solved!"},
+                         [self._session_cookie(session)])
+
+    async def download_challenge_file(self, scope: Scope, receive: Receive, send: Send,
+                                      challenge_id: str, filename: str) -> None:
+        if "user" not in self._load_session(scope):
+            await self._redirect(scope, send, "/")
+            return
+        file_path = await self.run(webapp.get_challenge_file, challenge_id, filename)
+        if file_path and file_path.exists():
+            await self._send_file(scope, send, file_path, file_path.name)
+            return
+        # Flask flashes the error and redirects back to the challenge
+        await self._delegate(scope, receive, send)
+
+    async def serve_custom_file(self, scope: Scope, receive: Receive, send: Send,
+                                challenge_id: str, filename: str) -> None:
+        if "user" not in self._load_session(scope):
+            await self._redirect(scope, send, "/")
+            return
+        result = await self.run(webapp.get_custom_file, challenge_id, filename)
+        if not result:
+            await self._delegate(scope, receive, send)
+            return
+        file_path, original_filename = result
+        # Stored paths are relative to the app, as send_file treats them
+        await self._send_file(scope, send, Path(self.flask_app.root_path) / file_path, original_filename)
+
+application = AsyncGateway(webapp.app, db_threads=int(os.environ.get('CTF_ASGI_DB_THREADS', 16)),
+                           wsgi_threads=int(os.environ.get('CTF_ASGI_WSGI_THREADS', 32)))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+import os
+import gzip
+import json
+import hashlib
+import argparse
+from pathlib import Path
+from typing import Optional, Dict, List
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always produced
+    brotli = None
+
+MANIFEST_NAME = "manifest.json"
+
+def fingerprint(name: str, data: bytes) -> str:
+    """Insert a short content hash before the extension: style.css -> style.3f2a9c1b7d4e.css"""
+    stem, dot, ext = name.rpartition(".")
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    return f"{stem}.{digest}.{ext}" if dot else f"{name}.{digest}"
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress a payload with the given content-coding at its strongest setting"""
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    # mtime=0 keeps the output reproducible between builds
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+def build_assets(static_dir: str = "static", dist_dir: Optional[str] = None) -> Dict[str, str]:
+    """Write fingerprinted and precompressed copies of static files plus a manifest"""
+    static_root = Path(static_dir)
+    dist_root = Path(dist_dir) if dist_dir else static_root / "dist"
+    dist_root.mkdir(parents=True, exist_ok=True)
+    encodings = ["gzip"] + (["br"] if brotli else [])
+    suffixes = {"gzip": ".gz", "br": ".br"}
+
+    manifest = {}
+    for source in sorted(static_root.rglob("*")):
+        if not source.is_file() or dist_root in source.parents:
+            continue
+        name = source.relative_to(static_root).as_posix()
+        data = source.read_bytes()
+        hashed = fingerprint(name, data)
+        target = dist_root / hashed
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+        for encoding in encodings:
+            packed = compress(data, encoding)
+            # Keep the compressed variant only when it actually saves bytes
+            if len(packed) < len(data):
+                target.with_name(target.name + suffixes[encoding]).write_bytes(packed)
+        manifest[name] = hashed
+
+    # Drop outputs of earlier builds
+    keep = set()
+    for hashed in manifest.values():
+        keep.update({hashed, hashed + ".gz", hashed + ".br"})
+    keep.add(MANIFEST_NAME)
+    for built in dist_root.rglob("*"):
+        if built.is_file() and built.relative_to(dist_root).as_posix() not in keep:
+            built.unlink()
+
+    with open(dist_root / MANIFEST_NAME, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+def load_manifest(dist_dir: str) -> Dict[str, str]:
+    """Read the asset manifest, or an empty one if assets were never built"""
+    manifest_path = os.path.join(dist_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+def accepted_encodings(accept_encoding: str) -> List[str]:
+    """Content-codings the client accepts, preferring brotli over gzip"""
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        token, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if token:
+            offered[token] = quality
+    return [e for e in ("br", "gzip") if offered.get(e, offered.get("*", 0)) > 0]
+
+# Build the assets from the command line
+def main():
+    parser = argparse.ArgumentParser(description="Fingerprint and precompress static assets")
+    parser.add_argument('--static', default='static', help="Static files directory")
+    parser.add_argument('--dist', default=None, help="Output directory (default: <static>/dist)")
+    args = parser.parse_args()
+
+    manifest = build_assets(args.static, args.dist)
+    for name, hashed in manifest.items():
+        print(f"{name} -> {hashed}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+import os
+import time
+import queue
+import shutil
+import asyncio
+import argparse
+import tempfile
+import threading
+from urllib.parse import urlencode
+from typing import Optional, Dict, Any, List, Tuple
+
+from ctforge import _parse_size
+
+# Each benchmark run gets its own database, challenges, bus and submission log so the real
+# platform stays untouched; these must be set before webapp is imported
+_scratch = tempfile.mkdtemp(prefix="ctf-bench-")
+os.environ["CTF_CHALLENGES_DIR"] = os.path.join(_scratch, "challenges")
+os.environ["CTF_PREVIEW_DIR"] = os.path.join(_scratch, "preview_cache")
+os.environ["CTF_BUS_DB"] = os.path.join(_scratch, "bus.db")
+os.environ["CTF_SUBMISSIONS_DB"] = os.path.join(_scratch, "submissions.db")
+os.environ["CTF_SUBMISSIONS_LOG"] = os.path.join(_scratch, "submissions.log")
+os.environ["CTF_INSTANCES_DB"] = os.path.join(_scratch, "instances.db")
+os.environ["CTF_POOL_DIR"] = os.path.join(_scratch, "challenge_pool")
+os.environ["CTF_POOL_DEPTH"] = "0"
+
+#class for one emulated client connection and what happened to it
+class Client:
+    def __init__(self, kind: str, path: str, method: str = "GET", body: bytes = b"", rate: Optional[int] = None):
+        self.kind = kind
+        self.path = path
+        self.method = method
+        self.body = body
+        # Bytes per second the client reads at; None reads as fast as the server writes
+        self.rate = rate
+        self.status: Optional[int] = None
+        self.received = 0
+        self.started = 0.0
+        self.finished = 0.0
+
+    def consume(self, size: int) -> float:
+        """Account for a body chunk; returns how long a client at this rate needs to read it"""
+        self.received += size
+        return size / self.rate if self.rate else 0.0
+
+def _make_clients(challenge_id: str, filename: str, flag: str, downloads: int, submissions: int,
+                  rate: int) -> List[Client]:
+    """Slow downloaders first, then flag submissions arriving while they are being served"""
+    clients = [Client("download", f"/download/{challenge_id}/{filename}", rate=rate) for _ in range(downloads)]
+    for i in range(submissions):
+        submitted = flag if i % 2 == 0 else "CTF{wrong}"
+        body = urlencode({"challenge_id": challenge_id, "challenge_type": "generated", "flag": submitted}).encode()
+        clients.append(Client("submit", "/submit_flag", "POST", body))
+    return clients
+
+#class for counting how many connections a server is working on at once
+class InService:
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def enter(self) -> None:
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def leave(self) -> None:
+        with self._lock:
+            self.current -= 1
+
+def run_sync(app, clients: List[Client], cookie: str, workers: int, gap: float) -> InService:
+    """Emulate gunicorn sync workers: each of `workers` threads serves one connection start to finish"""
+    from werkzeug.test import EnvironBuilder
+
+    backlog: "queue.Queue[Optional[Client]]" = queue.Queue()
+    in_service = InService()
+
+    def worker() -> None:
+        while True:
+            client = backlog.get()
+            if client is None:
+                return
+            in_service.enter()
+            builder = EnvironBuilder(path=client.path, method=client.method, data=client.body,
+                                     content_type="application/x-www-form-urlencoded" if client.body else None,
+                                     headers={"Cookie": cookie})
+            environ = builder.get_environ()
+            builder.close()
+
+            def start_response(status, headers, exc_info=None):
+                client.status = int(status.split()[0])
+
+            body = app(environ, start_response)
+            try:
+                for chunk in body:
+                    # The worker is pinned until the client has read everything
+                    time.sleep(client.consume(len(chunk)))
+            finally:
+                if hasattr(body, "close"):
+                    body.close()
+            client.finished = time.perf_counter()
+            in_service.leave()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for client in clients:
+        client.started = time.perf_counter()
+        backlog.put(client)
+        time.sleep(gap)
+    for _ in threads:
+        backlog.put(None)
+    for thread in threads:
+        thread.join()
+    return in_service
+
+def run_async(application, clients: List[Client], cookie: str, gap: float) -> InService:
+    """Serve every connection as a task on one event loop, as a single uvicorn worker would"""
+    in_service = InService()
+
+    async def connect(client: Client) -> None:
+        in_service.enter()
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": client.method,
+            "scheme": "http", "path": client.path, "raw_path": client.path.encode(), "query_string": b"",
+            "root_path": "", "server": ("127.0.0.1", 8000), "client": ("127.0.0.1", 40000),
+            "headers": [(b"host", b"127.0.0.1:8000"), (b"cookie", cookie.encode()),
+                        (b"content-type", b"application/x-www-form-urlencoded"),
+                        (b"content-length", str(len(client.body)).encode())],
+        }
+        sent = False
+
+        async def receive() -> Dict[str, Any]:
+            nonlocal sent
+            if sent:
+                # Nothing more arrives until the client goes away
+                await asyncio.Event().wait()
+            sent = True
+            return {"type": "http.request", "body": client.body, "more_body": False}
+
+        async def send(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                client.status = message["status"]
+            elif message["type"] == "http.response.body":
+                # Only this connection waits for the client to drain its socket
+                await asyncio.sleep(client.consume(len(message.get("body", b""))))
+
+        await application(scope, receive, send)
+        client.finished = time.perf_counter()
+        in_service.leave()
+
+    async def main() -> None:
+        tasks = []
+        for client in clients:
+            client.started = time.perf_counter()
+            tasks.append(asyncio.create_task(connect(client)))
+            await asyncio.sleep(gap)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    return in_service
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+def summarize(clients: List[Client], in_service: InService, elapsed: float) -> Dict[str, Any]:
+    """Latency of flag submissions and completion of downloads"""
+    submit = [(c.finished - c.started) * 1000 for c in clients if c.kind == "submit"]
+    downloads = [c for c in clients if c.kind == "download"]
+    return {
+        "elapsed": elapsed,
+        "peak_connections": in_service.peak,
+        "submit_ok": sum(1 for c in clients if c.kind == "submit" and c.status == 200),
+        "submit_p50": _percentile(submit, 0.5),
+        "submit_p95": _percentile(submit, 0.95),
+        "submit_max": max(submit, default=0.0),
+        "downloads_ok": sum(1 for c in downloads if c.status == 200 and c.received),
+        "download_bytes": sum(c.received for c in downloads),
+    }
+
+def _bench_challenge(webapp, size: int) -> Tuple[str, str, str]:
+    """Generate a layered-archive challenge in the scratch directory whose evidence file is about `size` bytes"""
+    from ctforge import ChallengeGenerator, ChallengeType, SUBTYPES
+    import catalog
+
+    family = ChallengeType.FORENSICS
+    info = ChallengeGenerator(artifact_size=size).generate_challenge(
+        family, webapp.CHALLENGES_DIR, SUBTYPES[family]["LAYERED_ARCHIVE"])
+    catalog.sync_generated(webapp.CHALLENGES_DIR)
+    return info["id"], "evidence.bin", info["flag"]
+
+# Compare connection capacity of the sync Flask app and the ASGI gateway
+def main():
+    parser = argparse.ArgumentParser(description="Flag submission latency while slow clients download files")
+    parser.add_argument('--downloads', type=int, default=16, help="Slow clients downloading at once")
+    parser.add_argument('--submissions', type=int, default=50, help="Flag submissions sent meanwhile")
+    parser.add_argument('--file-size', default='2M', help="Size of the downloaded file, e.g. 512K or 8M")
+    parser.add_argument('--client-rate', default='1M', help="Bytes per second each slow client reads")
+    parser.add_argument('--workers', type=int, default=4, help="Sync workers, as in gunicorn -w")
+    parser.add_argument('--gap', type=float, default=0.01, help="Seconds between connection arrivals")
+    parser.add_argument('--mode', choices=['sync', 'async', 'both'], default='both')
+    args = parser.parse_args()
+
+    # webapp opens ctf_platform.db and custom_challenges relative to the working directory
+    os.chdir(_scratch)
+    import webapp
+    import asgi
+
+    challenge_id, filename, flag = _bench_challenge(webapp, _parse_size(args.file_size))
+    serializer = webapp.app.session_interface.get_signing_serializer(webapp.app)
+    cookie = f"{webapp.app.config['SESSION_COOKIE_NAME']}={serializer.dumps({'user': 'benchmark'})}"
+    rate = _parse_size(args.client_rate)
+    print(f"{args.downloads} clients downloading {args.file_size} at {args.client_rate}/s, "
+          f"{args.submissions} flag submissions arriving meanwhile")
+    print("Both apps are driven in-process with emulated clients; these numbers compare the serving models, "
+          "they are not measurements of a deployed server")
+
+    results = {}
+    try:
+        if args.mode in ('sync', 'both'):
+            clients = _make_clients(challenge_id, filename, flag, args.downloads, args.submissions, rate)
+            started = time.perf_counter()
+            in_service = run_sync(webapp.app, clients, cookie, args.workers, args.gap)
+            results[f"sync, {args.workers} workers"] = summarize(clients, in_service, time.perf_counter() - started)
+        if args.mode in ('async', 'both'):
+            clients = _make_clients(challenge_id, filename, flag, args.downloads, args.submissions, rate)
+            started = time.perf_counter()
+            in_service = run_async(asgi.application, clients, cookie, args.gap)
+            results[f"async, 1 worker, {asgi.application.executor._max_workers} threads"] = \
+                summarize(clients, in_service, time.perf_counter() - started)
+    finally:
+        webapp.submission_log.flush()
+        shutil.rmtree(_scratch, ignore_errors=True)
+
+    for name, result in results.items():
+        print(f"\n{name}")
+        print(f"  connections served at once: {result['peak_connections']}")
+        print(f"  flag submissions: {result['submit_ok']} ok, p50 {result['submit_p50']:.1f} ms, "
+              f"p95 {result['submit_p95']:.1f} ms, max {result['submit_max']:.1f} ms")
+        print(f"  downloads: {result['downloads_ok']} complete, {result['download_bytes'] / 1024 ** 2:.1f} MiB")
+        print(f"  wall time: {result['elapsed']:.1f} s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+import os
+import io
+import sys
+import json
+import sqlite3
+import tarfile
+import hashlib
+import argparse
+import datetime
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Iterator, Tuple, List, Set
+
+import catalog
+import layout
+
+BUNDLE_FORMAT = 1
+MANIFEST_NAME = "manifest.json"
+ROWS_NAME = "custom_challenges.json"
+CHUNK_SIZE = 1024 * 1024
+
+def hash_file(path: Path) -> str:
+    """Return the sha256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def iter_challenge_files(challenges_dir: Path, ids: Optional[Set[str]] = None) -> Iterator[Tuple[str, str, Path]]:
+    """Yield (challenge_id, arcname, path) for every file of every (or each listed) generated challenge"""
+    if not challenges_dir.exists():
+        return
+    if ids is not None:
+        dirs = (layout.resolve(challenges_dir, i) for i in sorted(ids))
+    else:
+        dirs = layout.iter_challenge_dirs(challenges_dir)
+    for challenge_dir in dirs:
+        if challenge_dir is None:
+            continue
+        for file_path in sorted(challenge_dir.rglob("*")):
+            # Bytecode left by running a web challenge is rebuilt on the target
+            if "__pycache__" in file_path.parts or file_path.suffix == ".pyc":
+                continue
+            if file_path.is_file():
+                arcname = "challenges/" + file_path.relative_to(challenges_dir).as_posix()
+                yield challenge_dir.name, arcname, file_path
+
+def load_custom_rows(db_path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Read custom challenge rows and their file rows as dicts keyed by column name"""
+    rows = {"custom_challenges": [], "challenge_files": []}
+    if not os.path.exists(db_path):
+        return rows
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    for table in rows:
+        try:
+            cursor.execute(f"SELECT * FROM {table}")
+        except sqlite3.OperationalError:
+            continue
+        rows[table] = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+def iter_upload_files(rows: Dict[str, List[Dict[str, Any]]], uploads_dir: Path) -> Iterator[Tuple[str, str, Path]]:
+    """Yield (challenge_id, arcname, path) for uploads referenced by challenge_files rows"""
+    for file_row in rows["challenge_files"]:
+        file_path = uploads_dir / file_row["filename"]
+        if file_path.is_file():
+            yield file_row["challenge_id"], f"custom_challenges/{file_row['filename']}", file_path
+
+def with_hashes(entries: Iterator[Tuple[str, str, Path]]) -> Iterator[Dict[str, Any]]:
+    """Attach size and sha256 to each (owner, arcname, path) entry"""
+    for owner, arcname, path in entries:
+        yield {
+            "owner": owner,
+            "path": arcname,
+            "source": path,
+            "size": path.stat().st_size,
+            "sha256": hash_file(path),
+        }
+
+def read_manifest(bundle_path: str) -> Dict[str, Any]:
+    """Read the manifest from the head of a bundle without decompressing the rest"""
+    with tarfile.open(bundle_path, "r|gz") as tar:
+        member = tar.next()
+        if member is None or member.name != MANIFEST_NAME:
+            raise ValueError(f"{bundle_path} is not a challenge bundle (missing {MANIFEST_NAME})")
+        return json.load(tar.extractfile(member))
+
+def build_manifest(entries: Iterator[Dict[str, Any]], previous: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Build a manifest and the list of entries to ship, skipping owners unchanged since `previous`"""
+    state = {}
+    by_owner: Dict[str, List[Dict[str, Any]]] = {}
+    for entry in entries:
+        state[entry["path"]] = {"sha256": entry["sha256"], "size": entry["size"]}
+        by_owner.setdefault(entry["owner"], []).append(entry)
+
+    previous_state = previous["state"] if previous else {}
+    selected = []
+    for owner, owner_entries in by_owner.items():
+        # A challenge ships as a whole as soon as any of its files changed
+        if any(previous_state.get(e["path"]) != state[e["path"]] for e in owner_entries):
+            selected.extend(owner_entries)
+
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "created_at": datetime.datetime.utcnow().isoformat(timespec="seconds"),
+        "base": previous["created_at"] if previous else None,
+        "files": [{"path": e["path"], "sha256": e["sha256"], "size": e["size"]} for e in selected],
+        "state": state,
+    }
+    return manifest, selected
+
+def _row_digest(row: Dict[str, Any], file_rows: List[Dict[str, Any]]) -> str:
+    """Digest a custom challenge row together with its file rows"""
+    files = sorted(f["filename"] for f in file_rows if f["challenge_id"] == row["id"])
+    return hashlib.sha256(json.dumps([row, files], sort_keys=True, default=str).encode()).hexdigest()
+
+def _add_bytes(tar: tarfile.TarFile, name: str, data: bytes) -> None:
+    """Append an in-memory member to a streaming tar"""
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(datetime.datetime.utcnow().timestamp())
+    tar.addfile(info, io.BytesIO(data))
+
+def export_bundle(output: str, challenges_dir: str = "challenges", uploads_dir: str = "custom_challenges",
+                  db_path: str = "ctf_platform.db", since: Optional[str] = None,
+                  only: Optional[Set[str]] = None) -> Dict[str, Any]:
+    """Stream challenges, custom challenge rows and referenced uploads into a gzip tar bundle
+
+    `only` restricts the bundle to the given generated and custom challenge ids.
+    """
+    rows = load_custom_rows(db_path)
+    previous = read_manifest(since) if since else None
+    if only is not None:
+        rows = {
+            "custom_challenges": [r for r in rows["custom_challenges"] if r["id"] in only],
+            "challenge_files": [r for r in rows["challenge_files"] if r["challenge_id"] in only],
+        }
+
+    def entries() -> Iterator[Tuple[str, str, Path]]:
+        yield from iter_challenge_files(Path(challenges_dir), only)
+        yield from iter_upload_files(rows, Path(uploads_dir))
+
+    manifest, selected = build_manifest(with_hashes(entries()), previous)
+
+    # Rows are diffed by digest so review status changes travel in incremental bundles too
+    row_state = {row["id"]: _row_digest(row, rows["challenge_files"]) for row in rows["custom_challenges"]}
+    previous_rows = previous.get("rows", {}) if previous else {}
+    shipped = {e["owner"] for e in selected if e["path"].startswith("custom_challenges/")}
+    shipped |= {cid for cid, digest in row_state.items() if previous_rows.get(cid) != digest}
+    rows = {
+        "custom_challenges": [r for r in rows["custom_challenges"] if r["id"] in shipped],
+        "challenge_files": [r for r in rows["challenge_files"] if r["challenge_id"] in shipped],
+    }
+    manifest["rows"] = row_state
+
+    stream = sys.stdout.buffer if output == "-" else open(output, "wb")
+    try:
+        with tarfile.open(fileobj=stream, mode="w|gz") as tar:
+            _add_bytes(tar, MANIFEST_NAME, json.dumps(manifest, indent=2).encode())
+            _add_bytes(tar, ROWS_NAME, json.dumps(rows, indent=2, default=str).encode())
+            for entry in selected:
+                info = tar.gettarinfo(str(entry["source"]), arcname=entry["path"])
+                with open(entry["source"], "rb") as f:
+                    tar.addfile(info, f)
+    finally:
+        if stream is not sys.stdout.buffer:
+            stream.close()
+    return manifest
+
+def _safe_destination(arcname: str, challenges_dir: Path, uploads_dir: Path) -> Path:
+    """Map a bundle member name to its destination, refusing anything outside the target dirs"""
+    parts = Path(arcname).parts
+    if not parts or Path(arcname).is_absolute() or ".." in parts:
+        raise ValueError(f"Unsafe path in bundle: {arcname}")
+    if parts[0] == "challenges" and len(parts) > 2:
+        return challenges_dir.joinpath(*parts[1:])
+    if parts[0] == "custom_challenges" and len(parts) == 2:
+        return uploads_dir / parts[1]
+    raise ValueError(f"Unexpected member in bundle: {arcname}")
+
+def _existing_matches(destination: Path, sha256: str) -> bool:
+    """Check whether a blob is already present with the expected hash"""
+    return destination.is_file() and hash_file(destination) == sha256
+
+def _import_rows(db_path: str, rows: Dict[str, List[Dict[str, Any]]], uploads_dir: Path) -> int:
+    """Upsert custom challenge rows and replace their file rows in one transaction"""
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        # Column names come from the bundle, so only those the table really has are used
+        known = {column[1] for column in cursor.execute("PRAGMA table_info(custom_challenges)")}
+        for row in rows["custom_challenges"]:
+            unknown = set(row) - known
+            if unknown or "id" not in row:
+                raise ValueError(f"Unexpected columns in bundled custom challenge: {', '.join(sorted(unknown)) or 'no id'}")
+            columns = ", ".join(row)
+            placeholders = ", ".join("?" for _ in row)
+            cursor.execute(f"INSERT OR REPLACE INTO custom_challenges ({columns}) VALUES ({placeholders})",
+                           tuple(row.values()))
+            cursor.execute("DELETE FROM challenge_files WHERE challenge_id = ?", (row["id"],))
+            try:
+                # Let the web app's catalog re-index the row on its next start
+                cursor.execute("DELETE FROM challenge_assets WHERE challenge_id = ?", (row["id"],))
+                cursor.execute("DELETE FROM challenges WHERE id = ?", (row["id"],))
+            except sqlite3.OperationalError:
+                pass
+        for file_row in rows["challenge_files"]:
+            if Path(file_row["filename"]).name != file_row["filename"]:
+                raise ValueError(f"Unsafe upload name in bundle: {file_row['filename']}")
+            cursor.execute('''
+                INSERT INTO challenge_files (challenge_id, filename, original_filename, file_path)
+                VALUES (?, ?, ?, ?)
+            ''', (file_row["challenge_id"], file_row["filename"], file_row["original_filename"],
+                  os.path.join(str(uploads_dir), file_row["filename"])))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return len(rows["custom_challenges"])
+
+def import_bundle(bundle_path: str, challenges_dir: str = "challenges", uploads_dir: str = "custom_challenges",
+                  db_path: str = "ctf_platform.db", workers: int = 4) -> Dict[str, Any]:
+    """Import a bundle, verifying every blob hash and skipping blobs that already exist"""
+    challenges_root, uploads_root = Path(challenges_dir), Path(uploads_dir)
+    report = {"written": [], "skipped": [], "failed": [], "rows": 0}
+    # A fresh host has no tables yet; create them before any blob is written
+    catalog.init_platform(db_path)
+
+    stream = sys.stdin.buffer if bundle_path == "-" else open(bundle_path, "rb")
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool, \
+                tarfile.open(fileobj=stream, mode="r|gz") as tar:
+            member = tar.next()
+            if member is None or member.name != MANIFEST_NAME:
+                raise ValueError(f"{bundle_path} is not a challenge bundle (missing {MANIFEST_NAME})")
+            manifest = json.load(tar.extractfile(member))
+            if manifest.get("format") != BUNDLE_FORMAT:
+                raise ValueError(f"Unsupported bundle format: {manifest.get('format')}")
+            expected = {f["path"]: f["sha256"] for f in manifest["files"]}
+
+            # Hash what is already on disk in parallel while the stream is being read
+            present = {path: pool.submit(_existing_matches,
+                                         _safe_destination(path, challenges_root, uploads_root), sha256)
+                       for path, sha256 in expected.items()}
+
+            rows = {"custom_challenges": [], "challenge_files": []}
+            for member in tar:
+                if member.name == MANIFEST_NAME:
+                    continue
+                if member.name == ROWS_NAME:
+                    rows = json.load(tar.extractfile(member))
+                    continue
+                if not member.isfile() or member.name not in expected:
+                    report["failed"].append(member.name)
+                    continue
+                if present[member.name].result():
+                    report["skipped"].append(member.name)
+                    continue
+
+                destination = _safe_destination(member.name, challenges_root, uploads_root)
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                partial = destination.with_name(destination.name + ".partial")
+                digest = hashlib.sha256()
+                source = tar.extractfile(member)
+                with open(partial, "wb") as f:
+                    for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                        digest.update(chunk)
+                        f.write(chunk)
+                if digest.hexdigest() != expected[member.name]:
+                    partial.unlink()
+                    report["failed"].append(member.name)
+                    continue
+                os.replace(partial, destination)
+                report["written"].append(member.name)
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+    # A blob listed in the manifest that never arrived is as missing as one that failed its hash
+    arrived = set(report["written"]) | set(report["skipped"]) | set(report["failed"])
+    report["failed"].extend(sorted(set(expected) - arrived))
+    # Rows go in only once every blob they may reference is on disk
+    if rows["custom_challenges"] and not report["failed"]:
+        uploads_root.mkdir(parents=True, exist_ok=True)
+        report["rows"] = _import_rows(db_path, rows, uploads_root)
+    return report
+
+# Parse arguments and run export/import
+def main():
+    parser = argparse.ArgumentParser(description="Export or import CTF challenge bundles")
+    parser.add_argument('--challenges', default='challenges', help="Generated challenges directory")
+    parser.add_argument('--uploads', default='custom_challenges', help="Custom challenge uploads directory")
+    parser.add_argument('--db', default='ctf_platform.db', help="Platform database")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help="Write a bundle")
+    export_parser.add_argument('output', help="Bundle path, or - for stdout")
+    export_parser.add_argument('--since', help="Previous bundle; only ship challenges changed since it")
+
+    import_parser = subparsers.add_parser('import', help="Read a bundle")
+    import_parser.add_argument('bundle', help="Bundle path, or - for stdin")
+    import_parser.add_argument('--workers', type=int, default=4, help="Threads used to hash existing files")
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'export':
+            manifest = export_bundle(args.output, args.challenges, args.uploads, args.db, args.since)
+            print(f"Exported {len(manifest['files'])} files", file=sys.stderr)
+        else:
+            report = import_bundle(args.bundle, args.challenges, args.uploads, args.db, args.workers)
+            print(f"Written: {len(report['written'])}, skipped: {len(report['skipped'])}, "
+                  f"failed: {len(report['failed'])}, custom challenges: {report['rows']}")
+            for name in report['failed']:
+                print(f"  failed: {name}")
+            if report['failed']:
+                print("Custom challenge rows were not imported; import the bundle again once every file arrives")
+                exit(1)
+    except (OSError, ValueError, tarfile.TarError, sqlite3.Error) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        exit(1)
+
+if __name__ == '__main__':
+    main()
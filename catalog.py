@@ -0,0 +1,274 @@
+import os
+import json
+import sqlite3
+import hashlib
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+from ctforge import MANIFEST_NAME, write_manifest
+from records import CatalogEntry
+from layout import iter_challenge_dirs
+
+DB_PATH = 'ctf_platform.db'
+
+# Custom challenges as submitted and reviewed, their uploads, and user roles
+PLATFORM_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS custom_challenges (
+        id TEXT PRIMARY KEY,
+        title TEXT NOT NULL,
+        description TEXT NOT NULL,
+        category TEXT NOT NULL,
+        flag TEXT NOT NULL,
+        author TEXT NOT NULL,
+        status TEXT DEFAULT 'pending',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        reviewed_by TEXT,
+        reviewed_at TIMESTAMP,
+        review_notes TEXT
+    );
+    CREATE TABLE IF NOT EXISTS challenge_files (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        challenge_id TEXT,
+        filename TEXT NOT NULL,
+        original_filename TEXT NOT NULL,
+        file_path TEXT NOT NULL,
+        FOREIGN KEY (challenge_id) REFERENCES custom_challenges (id)
+    );
+    CREATE TABLE IF NOT EXISTS user_roles (
+        username TEXT PRIMARY KEY,
+        role TEXT DEFAULT 'user'
+    );
+    CREATE INDEX IF NOT EXISTS idx_custom_status ON custom_challenges (status, created_at);
+    CREATE INDEX IF NOT EXISTS idx_challenge_files_challenge ON challenge_files (challenge_id);
+'''
+
+# One row per challenge, generated or custom. For generated challenges `directory` and
+# asset paths are relative to the challenges root; for custom ones asset paths are the
+# stored upload paths.
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS challenges (
+        id TEXT PRIMARY KEY,
+        source TEXT NOT NULL,
+        category TEXT NOT NULL,
+        subtype TEXT,
+        title TEXT NOT NULL,
+        description TEXT,
+        hint TEXT,
+        author TEXT,
+        directory TEXT,
+        status TEXT NOT NULL DEFAULT 'published',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_challenges_listing ON challenges (source, status, created_at);
+    CREATE INDEX IF NOT EXISTS idx_challenges_category ON challenges (source, category, subtype);
+
+    CREATE TABLE IF NOT EXISTS challenge_assets (
+        challenge_id TEXT NOT NULL,
+        filename TEXT NOT NULL,
+        path TEXT NOT NULL,
+        size INTEGER,
+        sha256 TEXT,
+        PRIMARY KEY (challenge_id, filename),
+        FOREIGN KEY (challenge_id) REFERENCES challenges (id)
+    );
+'''
+
+def init_catalog(db_path: str = DB_PATH) -> None:
+    """Create the catalog tables and indexes"""
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    conn.commit()
+    conn.close()
+
+def init_platform(db_path: str = DB_PATH) -> None:
+    """Create every platform table, catalog included; used by the web app and by tools run before it"""
+    conn = sqlite3.connect(db_path)
+    conn.executescript(PLATFORM_SCHEMA)
+    conn.commit()
+    conn.close()
+    init_catalog(db_path)
+
+def hash_file(path: str) -> str:
+    """Return the sha256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _read_description(challenge_dir: Path) -> str:
+    """Return a challenge's README, or a placeholder"""
+    readme_path = challenge_dir / 'README.md'
+    if readme_path.exists():
+        with open(readme_path, 'r') as f:
+            return f.read()
+    return 'No description available'
+
+def _infer_info(challenge_dir: Path) -> Dict[str, Any]:
+    """Guess category and subtype for challenges generated before manifests existed"""
+    if (challenge_dir / 'app.py').exists():
+        category = 'web'
+    elif (challenge_dir / 'challenge.txt').exists():
+        category = 'crypto'
+    else:
+        category = 'forensics'
+    heading = _read_description(challenge_dir).splitlines()[0] if (challenge_dir / 'README.md').exists() else ''
+    subtype = heading.split(':', 1)[1].strip() if ':' in heading else None
+    return {"category": category, "subtype": subtype}
+
+def load_manifest(challenge_dir: Path) -> Dict[str, Any]:
+    """Read challenge.json, writing one first for legacy challenges"""
+    manifest_path = challenge_dir / MANIFEST_NAME
+    if manifest_path.exists():
+        with open(manifest_path) as f:
+            return json.load(f)
+    return write_manifest(challenge_dir, _infer_info(challenge_dir))
+
+def index_generated(cursor: sqlite3.Cursor, challenges_root: Path, challenge_dir: Path,
+                    manifest: Optional[Dict[str, Any]] = None) -> str:
+    """Insert or refresh a generated challenge and its assets"""
+    manifest = manifest or load_manifest(challenge_dir)
+    directory = challenge_dir.relative_to(challenges_root).as_posix()
+    cursor.execute('''
+        INSERT OR REPLACE INTO challenges
+            (id, source, category, subtype, title, description, hint, directory, status, created_at)
+        VALUES (?, 'generated', ?, ?, ?, ?, ?, ?, 'published', ?)
+    ''', (challenge_dir.name, manifest["category"], manifest.get("subtype"), manifest["title"],
+          _read_description(challenge_dir), manifest.get("hint", ""), directory, manifest.get("created_at")))
+    cursor.execute('DELETE FROM challenge_assets WHERE challenge_id = ?', (challenge_dir.name,))
+    cursor.executemany('''
+        INSERT INTO challenge_assets (challenge_id, filename, path, size, sha256) VALUES (?, ?, ?, ?, ?)
+    ''', [(challenge_dir.name, f["name"], f"{directory}/{f['name']}", f["size"], f["sha256"])
+          for f in manifest["files"]])
+    return challenge_dir.name
+
+def index_custom(cursor: sqlite3.Cursor, challenge_id: str, title: str, description: str, category: str,
+                 author: str, files: List[Dict[str, Any]], status: str = 'pending') -> None:
+    """Insert a custom challenge and its uploads; runs inside the caller's transaction"""
+    cursor.execute('''
+        INSERT OR REPLACE INTO challenges (id, source, category, title, description, author, status)
+        VALUES (?, 'custom', ?, ?, ?, ?, ?)
+    ''', (challenge_id, category, title, description, author, status))
+    cursor.execute('DELETE FROM challenge_assets WHERE challenge_id = ?', (challenge_id,))
+    for file_info in files:
+        exists = os.path.exists(file_info['file_path'])
+        cursor.execute('''
+            INSERT INTO challenge_assets (challenge_id, filename, path, size, sha256) VALUES (?, ?, ?, ?, ?)
+        ''', (challenge_id, file_info['filename'], file_info['file_path'],
+              os.path.getsize(file_info['file_path']) if exists else None,
+              hash_file(file_info['file_path']) if exists else None))
+
+def set_status(cursor: sqlite3.Cursor, challenge_id: str, status: str) -> None:
+    """Mirror a custom challenge's review status into the catalog"""
+    cursor.execute('UPDATE challenges SET status = ? WHERE id = ?', (status, challenge_id))
+
+def set_statuses(cursor: sqlite3.Cursor, challenge_ids: List[str], status: str) -> None:
+    """Mirror a batch of review decisions into the catalog"""
+    cursor.executemany('UPDATE challenges SET status = ? WHERE id = ?', [(status, cid) for cid in challenge_ids])
+
+def remove(cursor: sqlite3.Cursor, challenge_id: str) -> None:
+    """Drop a challenge and its assets from the catalog"""
+    cursor.execute('DELETE FROM challenge_assets WHERE challenge_id = ?', (challenge_id,))
+    cursor.execute('DELETE FROM challenges WHERE id = ?', (challenge_id,))
+
+def remove_uploads(cursor: sqlite3.Cursor, filenames: List[str]) -> int:
+    """Drop custom challenge assets whose upload has one of these names; runs inside the caller's transaction"""
+    # Uploads live flat in one directory under unique names, and stored paths depend on the app's cwd
+    wanted = set(filenames)
+    if not wanted:
+        return 0
+    cursor.execute('''
+        SELECT a.rowid, a.path FROM challenge_assets a
+        JOIN challenges c ON a.challenge_id = c.id
+        WHERE c.source = 'custom'
+    ''')
+    stale = [(rowid,) for rowid, path in cursor.fetchall() if os.path.basename(path) in wanted]
+    cursor.executemany('DELETE FROM challenge_assets WHERE rowid = ?', stale)
+    return len(stale)
+
+def sync_generated(challenges_root: Path, db_path: str = DB_PATH) -> int:
+    """Index challenge directories the catalog does not know about and forget vanished ones"""
+    if not challenges_root.exists():
+        return 0
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, directory FROM challenges WHERE source = 'generated'")
+    known = dict(cursor.fetchall())
+
+    on_disk = {d.name: d for d in iter_challenge_dirs(challenges_root)}
+    added = 0
+    for challenge_id, challenge_dir in on_disk.items():
+        if challenge_id not in known:
+            index_generated(cursor, challenges_root, challenge_dir)
+            added += 1
+    for challenge_id in set(known) - set(on_disk):
+        remove(cursor, challenge_id)
+    conn.commit()
+    conn.close()
+    return added
+
+def sync_custom(db_path: str = DB_PATH) -> int:
+    """Index custom challenge rows that predate the catalog"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT * FROM custom_challenges
+        WHERE id NOT IN (SELECT id FROM challenges WHERE source = 'custom')
+    ''')
+    rows = cursor.fetchall()
+    for row in rows:
+        cursor.execute('SELECT filename, file_path FROM challenge_files WHERE challenge_id = ?', (row['id'],))
+        files = [{'filename': f['filename'], 'file_path': f['file_path']} for f in cursor.fetchall()]
+        index_custom(cursor, row['id'], row['title'], row['description'], row['category'],
+                     row['author'], files, row['status'])
+        cursor.execute('UPDATE challenges SET created_at = ? WHERE id = ?', (row['created_at'], row['id']))
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+def list_challenges(source: str, status: Optional[str] = None, category: Optional[str] = None,
+                    db_path: str = DB_PATH) -> List[CatalogEntry]:
+    """List catalog rows for one source, newest first"""
+    query = 'SELECT * FROM challenges WHERE source = ?'
+    params: List[Any] = [source]
+    if status:
+        query += ' AND status = ?'
+        params.append(status)
+    if category:
+        query += ' AND category = ?'
+        params.append(category)
+    query += ' ORDER BY created_at DESC'
+
+    conn = sqlite3.connect(db_path)
+    rows = CatalogEntry.from_rows(conn.execute(query, params))
+    conn.close()
+    return rows
+
+def get_challenge(challenge_id: str, db_path: str = DB_PATH) -> Optional[Dict[str, Any]]:
+    """Fetch one catalog row with its assets"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    row = conn.execute('SELECT * FROM challenges WHERE id = ?', (challenge_id,)).fetchone()
+    if row is None:
+        conn.close()
+        return None
+    challenge = dict(row)
+    challenge['assets'] = [dict(a) for a in conn.execute(
+        'SELECT filename, path, size, sha256 FROM challenge_assets WHERE challenge_id = ? ORDER BY filename',
+        (challenge_id,)).fetchall()]
+    conn.close()
+    return challenge
+
+def get_asset(challenge_id: str, filename: str, db_path: str = DB_PATH) -> Optional[Dict[str, Any]]:
+    """Look up one player-visible file by primary key, with its challenge's source and status"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    row = conn.execute('''
+        SELECT a.filename, a.path, a.size, a.sha256, c.source, c.status
+        FROM challenge_assets a
+        JOIN challenges c ON a.challenge_id = c.id
+        WHERE a.challenge_id = ? AND a.filename = ?
+    ''', (challenge_id, filename)).fetchone()
+    conn.close()
+    return dict(row) if row else None
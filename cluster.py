@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, Callable, List
+
+def load_secret_key(instance_dir: Path) -> bytes:
+    """Load the session signing key shared by every worker and node
+
+    CTF_SECRET_KEY or CTF_SECRET_KEY_FILE win; otherwise a key file in instance_dir is
+    created once and reused, which is enough for several workers on one host.
+    """
+    if os.environ.get('CTF_SECRET_KEY'):
+        return os.environ['CTF_SECRET_KEY'].encode()
+    key_path = Path(os.environ.get('CTF_SECRET_KEY_FILE', Path(instance_dir) / 'secret_key'))
+    try:
+        # O_EXCL makes exactly one worker win the race to create the key
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        for _ in range(50):
+            key = key_path.read_bytes()
+            if key:
+                return key
+            # Another worker created the file but has not written the key yet
+            time.sleep(0.1)
+        raise RuntimeError(f"Secret key file {key_path} is empty")
+    key = os.urandom(32).hex().encode()
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+#class for a per-worker cache that the invalidation bus keeps coherent
+class LocalCache:
+    def __init__(self):
+        self._values: Dict[Any, Any] = {}
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so a load that raced one is not stored
+        self._generation = 0
+
+    def get_or_load(self, key: Any, loader: Callable[[], Any]) -> Any:
+        """Return the cached value for key, loading it on a miss"""
+        with self._lock:
+            if key in self._values:
+                return self._values[key]
+            generation = self._generation
+        value = loader()
+        with self._lock:
+            if self._generation == generation:
+                self._values[key] = value
+        return value
+
+    def invalidate(self, key: Any = None) -> None:
+        """Forget one key, or everything"""
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._values.clear()
+            else:
+                self._values.pop(key, None)
+
+#class that broadcasts events to every worker through a small SQLite table
+class InvalidationBus:
+    def __init__(self, db_path: str = 'ctf_bus.db', poll_interval: float = 0.5, retention: float = 3600.0):
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._subscribers: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+        self._local_subscribers: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+        self._last_id = 0
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection that waits out concurrent writers"""
+        return sqlite3.connect(self.db_path, timeout=5.0)
+
+    def _init_db(self) -> None:
+        """Create the event table in WAL mode so readers never block writers"""
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS invalidation_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic TEXT NOT NULL,
+                key TEXT,
+                payload TEXT,
+                origin INTEGER,
+                created_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def subscribe(self, topic: str, callback: Callable[[Dict[str, Any]], None], local: bool = False) -> None:
+        """Call callback(event) in every worker whenever topic is published; '*' matches all
+
+        With local=True the publishing worker also runs it before publish() returns, instead of
+        only on its next poll; the callback must then tolerate seeing the event twice.
+        """
+        self._subscribers.setdefault(topic, []).append(callback)
+        if local:
+            self._local_subscribers.setdefault(topic, []).append(callback)
+
+    def publish(self, topic: str, payload: Optional[Dict[str, Any]] = None, key: Optional[str] = None) -> None:
+        """Append an event for every worker, including this one, to pick up"""
+        conn = self._connect()
+        cursor = conn.execute('INSERT INTO invalidation_events (topic, key, payload, origin, created_at) VALUES (?, ?, ?, ?, ?)',
+                              (topic, key, json.dumps(payload or {}), os.getpid(), time.time()))
+        conn.commit()
+        conn.close()
+        # So the request that made the change already sees it when it redirects
+        self._dispatch({'id': cursor.lastrowid, 'topic': topic, 'key': key, 'payload': payload or {},
+                        'origin': os.getpid()}, self._local_subscribers)
+
+    def _dispatch(self, event: Dict[str, Any], subscribers: Optional[Dict[str, List[Callable]]] = None) -> None:
+        """Run the callbacks for one event, isolating their failures"""
+        subscribers = self._subscribers if subscribers is None else subscribers
+        for callback in subscribers.get(event['topic'], []) + subscribers.get('*', []):
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"Error handling {event['topic']} event: {e}")
+
+    def poll(self) -> int:
+        """Dispatch events newer than the last one seen and return how many there were"""
+        conn = self._connect()
+        rows = conn.execute('SELECT id, topic, key, payload, origin FROM invalidation_events WHERE id > ? ORDER BY id',
+                            (self._last_id,)).fetchall()
+        conn.close()
+        for row_id, topic, key, payload, origin in rows:
+            self._last_id = row_id
+            self._dispatch({'id': row_id, 'topic': topic, 'key': key, 'payload': json.loads(payload), 'origin': origin})
+        return len(rows)
+
+    def latest_id(self) -> int:
+        """Id of the most recent event ever published"""
+        conn = self._connect()
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'invalidation_events'").fetchone()
+        conn.close()
+        return row[0] if row else 0
+
+    def replay(self, since: int, limit: int = 1024) -> Optional[List[Dict[str, Any]]]:
+        """Events after `since` in publish order, or None if some were pruned or there are more than `limit`"""
+        conn = self._connect()
+        oldest = conn.execute('SELECT MIN(id) FROM invalidation_events').fetchone()[0]
+        latest = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'invalidation_events'").fetchone()
+        rows = conn.execute('SELECT id, topic, key, payload, created_at FROM invalidation_events WHERE id > ? '
+                            'ORDER BY id LIMIT ?', (since, limit + 1)).fetchall()
+        conn.close()
+        first_kept = oldest if oldest is not None else (latest[0] + 1 if latest else 1)
+        if since + 1 < first_kept or len(rows) > limit:
+            return None
+        return [{'id': row_id, 'topic': topic, 'key': key, 'payload': json.loads(payload), 'created_at': created_at}
+                for row_id, topic, key, payload, created_at in rows]
+
+    def prune(self) -> None:
+        """Delete events older than the retention window"""
+        conn = self._connect()
+        conn.execute('DELETE FROM invalidation_events WHERE created_at < ?', (time.time() - self.retention,))
+        conn.commit()
+        conn.close()
+
+    def _run(self) -> None:
+        """Poll for events until the process exits"""
+        polls = 0
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.poll()
+                polls += 1
+                if polls % 1000 == 0:
+                    self.prune()
+            except sqlite3.Error as e:
+                print(f"Error polling invalidation bus: {e}")
+
+    def start(self) -> None:
+        """Start polling in this process; safe to call on every request and after fork"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Only events published from now on matter to a fresh worker
+            self._last_id = self.latest_id()
+            threading.Thread(target=self._run, daemon=True).start()
+            self._pid = os.getpid()
@@ -10,11 +10,16 @@ import piexif
 from flask import Flask, request
 from pathlib import Path
 from enum import Enum, auto
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import hashlib
+import json
+import datetime
 from cryptography.fernet import Fernet
 from PIL import Image
 from scapy.all import wrpcap, Ether, IP, UDP
+from records import ChallengeInfo
+import layered
+import layout
 
 class ChallengeType(Enum):
     WEB = auto()
@@ -40,21 +45,64 @@ class ForensicsChallengeType(Enum):
     EXIF_METADATA = auto()
     PCAP_ANALYSIS = auto()
     BINARY_FILE = auto()
+    LAYERED_ARCHIVE = auto()
+
+# Subtype enum of each challenge family
+SUBTYPES = {
+    ChallengeType.WEB: WebChallengeType,
+    ChallengeType.CRYPTO: CryptoChallengeType,
+    ChallengeType.FORENSICS: ForensicsChallengeType,
+}
+
+# Files that stay on the server and never show up in manifests or file listings
+HIDDEN_FILES = {"flag.txt", "SOLUTION.md", "challenge.json"}
+MANIFEST_NAME = "challenge.json"
+
+def describe_files(challenge_dir: Path) -> List[Dict[str, Any]]:
+    """List player-visible files of a challenge with sizes and sha256 hashes"""
+    files = []
+    for file_path in sorted(challenge_dir.iterdir()):
+        if file_path.is_file() and file_path.name not in HIDDEN_FILES:
+            digest = hashlib.sha256()
+            with open(file_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            files.append({"name": file_path.name, "size": file_path.stat().st_size, "sha256": digest.hexdigest()})
+    return files
+
+def write_manifest(challenge_dir: Path, info: Dict[str, Any]) -> Dict[str, Any]:
+    """Write challenge.json describing a generated challenge and return it"""
+    manifest = {
+        "id": challenge_dir.name,
+        "category": info["category"],
+        "subtype": info.get("subtype"),
+        # Full-length ids are shortened to the 8 hex digits older challenges used
+        "title": challenge_dir.name[:len(layout.PREFIX) + 8].replace("_", " ").title(),
+        "hint": info.get("hint", ""),
+        "tools": info.get("tools", []),
+        "run_command": info.get("run_command"),
+        "created_at": info.get("created_at") or datetime.datetime.utcnow().isoformat(sep=" ", timespec="seconds"),
+        "files": describe_files(challenge_dir),
+    }
+    with open(challenge_dir / MANIFEST_NAME, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
 
 #class for the generation
 class ChallengeGenerator:
-    def __init__(self):
+    def __init__(self, artifact_size: int = 1024 * 1024, layer_depth: int = 4):
         self.app = Flask(__name__)
+        # Filler bytes and number of layers for layered-archive forensics challenges
+        self.artifact_size = artifact_size
+        self.layer_depth = layer_depth
         
     def generate_flag(self) -> str:
         """Generate a unique CTF flag"""
         return f"CTF{{{str(uuid.uuid4())}}}"
 
     def create_challenge_directory(self, base_path: str) -> Path:
-        """Create a directory for the challenge"""
-        challenge_dir = Path(base_path) / f"challenge_{str(uuid.uuid4())[:8]}"
-        challenge_dir.mkdir(parents=True, exist_ok=True)
-        return challenge_dir
+        """Create a directory for the challenge in the sharded layout, under a collision-checked id"""
+        return layout.new_challenge_dir(Path(base_path))
 
     def save_flag(self, challenge_dir: Path, flag: str) -> None:
         """Save the flag to a file"""
@@ -65,9 +113,10 @@ class ChallengeGenerator:
             print(f"Error saving flag: {e}")
             raise
             
-    def generate_web_challenge(self, challenge_dir: Path, flag: str) -> Dict[str, Any]:
-        """Generate a random web challenge"""
-        challenge_type = random.choice(list(WebChallengeType))
+    def generate_web_challenge(self, challenge_dir: Path, flag: str,
+                               subtype: Optional[WebChallengeType] = None) -> Dict[str, Any]:
+        """Generate a web challenge, of a random subtype unless one is given"""
+        challenge_type = subtype or random.choice(list(WebChallengeType))
         db_path = challenge_dir / "database.db"
         
         # Setup database
@@ -125,26 +174,52 @@ class ChallengeGenerator:
         """Create SQL injection challenge"""
         app_code = f"""from flask import Flask, request
 import sqlite3
+import queue
 import os
+from contextlib import contextmanager
 
 app = Flask(__name__)
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+POOL_SIZE = int(os.environ.get('POOL_SIZE', 8))
+
+# Load the challenge database into memory once and hand out POOL_SIZE read-only copies of it;
+# the dev server starts a new thread per request, so connections cannot be kept per thread
+_disk = sqlite3.connect(os.path.join(BASE_DIR, '{db_path}'))
+_pool = queue.Queue()
+for _ in range(POOL_SIZE):
+    _conn = sqlite3.connect(':memory:', check_same_thread=False)
+    _disk.backup(_conn)
+    _conn.execute('PRAGMA query_only = ON')
+    _pool.put(_conn)
+_disk.close()
+
+@contextmanager
+def get_connection():
+    # Blocks while every connection is in use, so one request never shares a connection with another
+    conn = _pool.get()
+    try:
+        yield conn
+    finally:
+        _pool.put(conn)
+
 @app.route('/')
 def index():
     user_input = request.args.get('input', '')
-    conn = sqlite3.connect('{db_path}')
-    cursor = conn.cursor()
-    try:
-        cursor.execute(f"SELECT * FROM users WHERE name = '{{user_input}}'")
-        result = cursor.fetchall()
-    except Exception as e:
-        return str(e)
-    finally:
-        conn.close()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT * FROM users WHERE name = '{{user_input}}'")
+            result = cursor.fetchall()
+        except Exception as e:
+            return str(e)
+        finally:
+            cursor.close()
     return str(result)
 
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=5000)
+    # For more throughput: gunicorn -w 4 --threads 8 -b 0.0.0.0:$PORT app:app
+    app.run(host="0.0.0.0", port=int(os.environ.get('PORT', 5000)), threaded=True)
 """
         with open(challenge_dir / "app.py", "w") as f:
             f.write(app_code)
@@ -152,6 +227,7 @@ if __name__ == '__main__':
     def _create_xss_challenge(self, challenge_dir: Path) -> None:
         """Create XSS challenge"""
         app_code = """from flask import Flask, request
+import os
 
 app = Flask(__name__)
 
@@ -168,7 +244,7 @@ def index():
     '''
 
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=5000)
+    app.run(host="0.0.0.0", port=int(os.environ.get('PORT', 5000)))
 """
         with open(challenge_dir / "app.py", "w") as f:
             f.write(app_code)
@@ -196,7 +272,7 @@ def index():
         return "Error reading file"
 
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=5000)
+    app.run(host="0.0.0.0", port=int(os.environ.get('PORT', 5000)))
 """
         with open(challenge_dir / "app.py", "w") as f:
             f.write(app_code)
@@ -208,13 +284,14 @@ if __name__ == '__main__':
     def _create_brute_force_challenge(self, challenge_dir: Path, flag: str) -> None:
         """Create brute force challenge"""
         app_code = f"""from flask import Flask, request
+import os
 
 app = Flask(__name__)
 
 @app.route('/')
 def index():
     return '''
-        <form action="/login" method="POST">
+        <form action="login" method="POST">
             <input type="text" name="user" placeholder="Username">
             <input type="password" name="password" placeholder="Password">
             <button type="submit">Login</button>
@@ -230,7 +307,7 @@ def login():
     return 'Invalid login'
 
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=5000)
+    app.run(host="0.0.0.0", port=int(os.environ.get('PORT', 5000)))
 """
         with open(challenge_dir / "app.py", "w") as f:
             f.write(app_code)
@@ -240,9 +317,10 @@ if __name__ == '__main__':
         with open(challenge_dir / "README.md", "w") as f:
             f.write("# Web Challenge\n\nFind and exploit the vulnerability to get the flag!\n")
 
-    def generate_crypto_challenge(self, challenge_dir: Path, flag: str) -> Dict[str, Any]:
-        """Generate a random crypto challenge"""
-        challenge_type = random.choice(list(CryptoChallengeType))
+    def generate_crypto_challenge(self, challenge_dir: Path, flag: str,
+                                  subtype: Optional[CryptoChallengeType] = None) -> Dict[str, Any]:
+        """Generate a crypto challenge, of a random subtype unless one is given"""
+        challenge_type = subtype or random.choice(list(CryptoChallengeType))
         challenge_info = {
             "type": challenge_type.name.replace("_", " ").title(),
             "hint": "",
@@ -265,14 +343,18 @@ if __name__ == '__main__':
             
         elif challenge_type == CryptoChallengeType.VIGENERE:
             key = "CTFKEY"
-            encrypted_flag = "".join(chr(((ord(c) - 65 + ord(key[i % len(key)])) % 26 + 65)) if c.isalpha() else c
-        for i, c in enumerate(flag.upper()))
+            # Shift within each letter's own case so the flag decrypts back exactly
+            encrypted_flag = "".join(
+                chr((ord(c) - (65 if c.isupper() else 97) + ord(key[i % len(key)])) % 26 + (65 if c.isupper() else 97))
+                if c.isalpha() else c
+                for i, c in enumerate(flag))
     
             challenge_info["hint"] = f"The flag is encrypted using a Vigenère cipher. Key: {key}"
     
             challenge_info["solution_script"] = f"""def vigenere_decrypt(ciphertext, key):
     return ''.join(
-        chr(((ord(c) - 65 - ord(key[i % len(key)])) % 26 + 65)) if c.isalpha() else c
+        chr((ord(c) - (65 if c.isupper() else 97) - ord(key[i % len(key)])) % 26 + (65 if c.isupper() else 97))
+        if c.isalpha() else c
         for i, c in enumerate(ciphertext)
     )
 vigenere_decrypt(encrypted_flag, '{key}')"""
@@ -318,9 +400,10 @@ fernet.decrypt(encrypted_flag.encode()).decode()"""
 
         return challenge_info
         
-    def generate_forensics_challenge(self, challenge_dir: Path, flag: str) -> Dict[str, Any]:
-        """Generate a random forensics challenge"""
-        challenge_type = random.choice(list(ForensicsChallengeType))
+    def generate_forensics_challenge(self, challenge_dir: Path, flag: str,
+                                     subtype: Optional[ForensicsChallengeType] = None) -> Dict[str, Any]:
+        """Generate a forensics challenge, of a random subtype unless one is given"""
+        challenge_type = subtype or random.choice(list(ForensicsChallengeType))
         challenge_info = {
             "type": challenge_type.name.replace("_", " ").title(),
             "hint": "",
@@ -350,7 +433,7 @@ fernet.decrypt(encrypted_flag.encode()).decode()"""
 
             piexif.insert(exif_bytes, str(challenge_dir / "photo.jpg"))  # Embed EXIF
             challenge_info["hint"] = "Scan the image for metadata."
-            challenge_info["files"].append("image.jpg")
+            challenge_info["files"].append("photo.jpg")
             
         elif challenge_type == ForensicsChallengeType.PCAP_ANALYSIS:
             # Create fake PCAP with flag
@@ -371,6 +454,18 @@ fernet.decrypt(encrypted_flag.encode()).decode()"""
             challenge_info["files"].append("data.bin")
             challenge_info["tools"].extend(["strings", "xxd", "hexdump"])
 
+        elif challenge_type == ForensicsChallengeType.LAYERED_ARCHIVE:
+            # Streamed straight to disk, so memory use does not grow with artifact_size
+            rng = random.Random()
+            layers = layered.plan_layers(rng, self.layer_depth)
+            with open(challenge_dir / "evidence.bin", "wb") as f:
+                steps = layered.write_artifact(f, flag, self.artifact_size, layers, rng)
+            challenge_info["hint"] = ("The evidence is wrapped in several layers of archives and encodings. "
+                                      "Identify each one by its magic bytes and peel them off.")
+            challenge_info["files"].append("evidence.bin")
+            challenge_info["tools"].extend(["file", "binwalk", "CyberChef"])
+            challenge_info["solution_script"] = "\n".join(f"# {i}. {step}" for i, step in enumerate(steps, 1))
+
         with open(challenge_dir / "README.md", "w") as f:
             f.write(f"# Forensics Challenge: {challenge_info['type']}\n\n")
             f.write(f"**Hint**: {challenge_info['hint']}\n\n")
@@ -379,30 +474,36 @@ fernet.decrypt(encrypted_flag.encode()).decode()"""
 
         return challenge_info
 
-    def generate_challenge(self, challenge_type: ChallengeType, output_dir: str) -> Dict[str, Any]:
-        """Main method to generate a challenge"""
+    def generate_challenge(self, challenge_type: ChallengeType, output_dir: str,
+                           subtype: Optional[Enum] = None) -> ChallengeInfo:
+        """Main method to generate a challenge; subtype is a member of the family's enum in SUBTYPES"""
         challenge_dir = self.create_challenge_directory(output_dir)
         flag = self.generate_flag()
         self.save_flag(challenge_dir, flag)
         #provide challenge info
         challenge_info = {
+            "id": challenge_dir.name,
             "flag": flag,
             "directory": str(challenge_dir),
-            "type": challenge_type.name.lower()
+            "type": challenge_type.name.lower(),
+            "category": challenge_type.name.lower()
         }
 
         if challenge_type == ChallengeType.WEB:
-            web_info = self.generate_web_challenge(challenge_dir, flag)
+            web_info = self.generate_web_challenge(challenge_dir, flag, subtype)
             challenge_info.update(web_info)
             
         elif challenge_type == ChallengeType.CRYPTO:
-            crypto_info = self.generate_crypto_challenge(challenge_dir, flag)
+            crypto_info = self.generate_crypto_challenge(challenge_dir, flag, subtype)
             challenge_info.update(crypto_info)
             
         elif challenge_type == ChallengeType.FORENSICS:
-            forensics_info = self.generate_forensics_challenge(challenge_dir, flag)
+            forensics_info = self.generate_forensics_challenge(challenge_dir, flag, subtype)
             challenge_info.update(forensics_info)
 
+        # The family generators report their subtype as "type"
+        challenge_info["subtype"] = challenge_info["type"]
+
         # Create solution file
         with open(challenge_dir / "SOLUTION.md", "w") as f:
             f.write(f"# Solution\n\nFlag: `{flag}`\n\n")
@@ -413,7 +514,16 @@ fernet.decrypt(encrypted_flag.encode()).decode()"""
                 f.write(challenge_info["solution_script"])
                 f.write("\n```\n")
 
-        return challenge_info
+        challenge_info["manifest"] = write_manifest(challenge_dir, challenge_info)
+        return ChallengeInfo.from_mapping(challenge_info)
+
+def _parse_size(value: str) -> int:
+    """Parse a byte size such as 512K, 64M or 1G"""
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    value = value.strip().upper().rstrip("B")
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
 
 # Parse arguements and provide info
 def main():
@@ -422,9 +532,25 @@ def main():
                        required=True, help="Type of challenge to generate")
     parser.add_argument('--output', default='challenges', 
                        help="Output directory for challenges")
+    parser.add_argument('--count', type=int, default=1,
+                       help="Number of challenges to generate")
+    parser.add_argument('--validate', action='store_true',
+                       help="Solve each generated challenge and discard broken ones")
+    parser.add_argument('--max-attempts', type=int, default=None,
+                       help="Give up after this many generations when validating (default: 5x count)")
+    parser.add_argument('--subtype', default=None,
+                       help="Generate only this subtype, e.g. layered_archive")
+    parser.add_argument('--artifact-size', default='1M',
+                       help="Filler size of layered-archive challenges, e.g. 64M")
+    parser.add_argument('--layers', type=int, default=4,
+                       help="Number of layers in layered-archive challenges")
+    parser.add_argument('--db', default='ctf_platform.db',
+                       help="Platform database to list new challenges in; skipped if it does not exist")
+    parser.add_argument('--bus', default=os.environ.get('CTF_BUS_DB', 'ctf_bus.db'),
+                       help="Event bus of the running web app, told about new challenges")
     args = parser.parse_args()
 
-    generator = ChallengeGenerator()
+    generator = ChallengeGenerator(_parse_size(args.artifact_size), args.layers)
     
     try:
         challenge_type = {
@@ -432,20 +558,75 @@ def main():
             'crypto': ChallengeType.CRYPTO,
             'forensics': ChallengeType.FORENSICS
         }[args.type]
+        subtype = SUBTYPES[challenge_type][args.subtype.upper()] if args.subtype else None
         
-        result = generator.generate_challenge(challenge_type, args.output)
+        if args.validate:
+            results = generate_validated(generator, challenge_type, args.output, args.count,
+                                         args.max_attempts or args.count * 5, subtype)
+        else:
+            results = [generator.generate_challenge(challenge_type, args.output, subtype) for _ in range(args.count)]
         
-        print("==== Challenge successfully created ====\n")
-        print(f"Files Directory: {result['directory']}")
-        if challenge_type == ChallengeType.WEB:
-            
-            print(f"\nTo run the web challenge:")
-            print(f"{result['directory']} && python app.py")
+        register_generated(results, Path(args.output), args.db, args.bus)
+        
+        if results:
+            print("==== Challenge successfully created ====\n")
+            for result in results:
+                print(f"Files Directory: {result['directory']}")
+            if challenge_type == ChallengeType.WEB:
+                
+                print(f"\nTo run the web challenge:")
+                print(f"{results[0]['directory']} && python app.py")
+        if len(results) < args.count:
+            print(f"\nOnly {len(results)} of {args.count} challenges passed validation")
+            exit(1)
         
     except Exception as e:
         print(f"Error generating challenge: {e}")
         exit(1)
 
+def register_generated(results: List[Dict[str, Any]], challenges_root: Path, db_path: str, bus_path: str) -> None:
+    """List new challenges in the platform catalog and tell running workers, so they show up without a restart"""
+    if not results or not os.path.exists(db_path):
+        return
+    # catalog imports this module, so it can only be imported once both are loaded
+    import catalog
+    from cluster import InvalidationBus
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    for result in results:
+        catalog.index_generated(cursor, challenges_root.resolve(), Path(result['directory']).resolve(),
+                                result.get('manifest'))
+    conn.commit()
+    conn.close()
+
+    bus = InvalidationBus(bus_path)
+    for result in results:
+        challenge_id = Path(result['directory']).name
+        bus.publish('challenge_added', {'id': challenge_id, 'category': result['category']}, key=challenge_id)
+
+def generate_validated(generator: ChallengeGenerator, challenge_type: ChallengeType, output_dir: str,
+                       count: int, max_attempts: int, subtype: Optional[Enum] = None) -> list:
+    """Generate challenges in batches, keeping only those the validator can solve"""
+    from validator import validate_challenges, discard_failed
+
+    kept = []
+    attempts = 0
+    while len(kept) < count and attempts < max_attempts:
+        batch_size = min(count - len(kept), max_attempts - attempts)
+        batch = [generator.generate_challenge(challenge_type, output_dir, subtype) for _ in range(batch_size)]
+        attempts += batch_size
+        results = validate_challenges([info["directory"] for info in batch])
+        discarded = set(discard_failed(results))
+        for info, result in zip(batch, results):
+            if result["id"] in discarded:
+                print(f"Discarded {result['id']}: {result['detail']}")
+            else:
+                if result["status"] == "skip":
+                    print(f"Kept {result['id']} unchecked: {result['detail']}")
+                kept.append(info)
+    return kept
+
 #execute drafted piece of code
 if __name__ == '__main__':
     main()
@@ -0,0 +1,101 @@
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple, Iterator
+
+#class for in-process pub/sub with coalescing of bursty updates
+class EventBus:
+    def __init__(self, max_keys: int = 1024):
+        self.max_keys = max_keys
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._trimmed = 0
+        # (topic, key) -> (seq, event), ordered oldest to newest; a newer event with the same
+        # key replaces the older one, which is what coalesces bursts
+        self._latest: "OrderedDict[Tuple[str, Any], Tuple[int, Dict[str, Any]]]" = OrderedDict()
+
+    @property
+    def seq(self) -> int:
+        """Sequence number of the most recent event"""
+        return self._seq
+
+    def publish(self, topic: str, data: Dict[str, Any], key: Any = None, seq: Optional[int] = None) -> int:
+        """Record an event and wake every waiting subscriber
+
+        Pass `seq` to number events from a shared source, such as the invalidation bus, so
+        ids mean the same in every worker; it must increase from one call to the next.
+        """
+        with self._cond:
+            self._seq = max(self._seq + 1, seq) if seq is not None else self._seq + 1
+            slot = (topic, key)
+            self._latest.pop(slot, None)
+            self._latest[slot] = (self._seq, {"topic": topic, "data": data, "time": time.time()})
+            while len(self._latest) > self.max_keys:
+                _, (trimmed, _) = self._latest.popitem(last=False)
+                self._trimmed = trimmed
+            self._cond.notify_all()
+            return self._seq
+
+    def _collect(self, since: int) -> Tuple[int, Optional[List[Dict[str, Any]]]]:
+        """Events newer than `since`, or None if some were already trimmed away"""
+        events = []
+        for seq, event in reversed(self._latest.values()):
+            if seq <= since:
+                break
+            events.append(event)
+        if since < self._trimmed:
+            return self._seq, None
+        return self._seq, events[::-1]
+
+    def wait(self, since: int, timeout: float = 15.0, coalesce: float = 0.5) -> Tuple[int, Optional[List[Dict[str, Any]]]]:
+        """Block until there is something newer than `since`, then gather it after a short window"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > since, timeout):
+                return since, []
+        # Let the rest of a burst land so it goes out as one message
+        time.sleep(coalesce)
+        with self._cond:
+            return self._collect(since)
+
+    def stream(self, since: Optional[int] = None, keepalive: float = 15.0, coalesce: float = 0.5,
+               lifetime: Optional[float] = None, replay: Optional[List[Dict[str, Any]]] = None,
+               gap: bool = False) -> Iterator[str]:
+        """Yield server-sent event frames, for `lifetime` seconds or forever
+
+        `replay` holds invalidation bus events after `since`, read back when a browser reconnects
+        with Last-Event-ID, possibly to a different worker; `gap` means some were already pruned
+        and the page must refresh. Event ids are bus row ids, so they mean the same in every worker.
+        """
+        since = self._seq if since is None else since
+        deadline = time.monotonic() + lifetime if lifetime else None
+        yield "retry: 5000\n\n"
+        if gap:
+            yield f"id: {since}\nevent: resync\ndata: {{}}\n\n"
+        elif replay:
+            since = max(since, replay[-1]["id"])
+            # Coalesced by topic and key, as live events are
+            missed: "OrderedDict[Tuple[str, Any], Dict[str, Any]]" = OrderedDict()
+            for event in replay:
+                missed.pop((event["topic"], event["key"]), None)
+                missed[(event["topic"], event["key"])] = {"topic": event["topic"], "data": event["payload"],
+                                                          "time": event["created_at"]}
+            yield f"id: {since}\nevent: update\ndata: {json.dumps(list(missed.values()))}\n\n"
+        while True:
+            timeout = keepalive
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                timeout = min(keepalive, remaining)
+            since, events = self.wait(since, timeout, coalesce)
+            if events is None:
+                # The subscriber fell too far behind; ask the page to refresh itself
+                yield f"id: {since}\nevent: resync\ndata: {{}}\n\n"
+            elif events:
+                yield f"id: {since}\nevent: update\ndata: {json.dumps(events)}\n\n"
+            else:
+                yield ": keepalive\n\n"
+
+# Shared bus for the web app
+bus = EventBus()
@@ -0,0 +1,233 @@
+import io
+import zlib
+import base64
+import random
+import tarfile
+import zipfile
+import tempfile
+from typing import Optional, List, Tuple, Iterator, BinaryIO
+
+CHUNK_SIZE = 64 * 1024
+
+# A layer stream is (chunks, size); size is None when it cannot be known before the
+# chunks are produced, which is the case for anything compressed
+Stream = Tuple[Iterator[bytes], Optional[int]]
+
+LAYERS = ["xor", "base64", "gzip", "tar", "zip"]
+
+_LOG_TEMPLATES = [
+    "{date} {host} sshd[{pid}]: Accepted publickey for {user} from 10.{a}.{b}.{c} port {port} ssh2\n",
+    "{date} {host} kernel: [{uptime}.{frac}] EXT4-fs (sda{a}): mounted filesystem with ordered data mode\n",
+    "{date} {host} CRON[{pid}]: ({user}) CMD (/usr/local/bin/backup.sh --incremental)\n",
+    "10.{a}.{b}.{c} - - [{date}] \"GET /static/app.{pid}.js HTTP/1.1\" 200 {port} \"-\" \"Mozilla/5.0\"\n",
+    "{uptime},{user},{host},{a}.{b}{c},{port}\n",
+]
+
+def _text_block(rng: random.Random, size: int) -> bytes:
+    """Log- and CSV-like text, the kind of filler a real disk or capture is full of"""
+    lines = []
+    total = 0
+    while total < size:
+        line = rng.choice(_LOG_TEMPLATES).format(
+            date=f"Mar {rng.randint(1, 28):2d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}",
+            host=rng.choice(["web01", "db02", "build", "fw-edge"]), pid=rng.randint(100, 65000),
+            user=rng.choice(["root", "deploy", "backup", "www-data", "alice"]), a=rng.randint(0, 255),
+            b=rng.randint(0, 255), c=rng.randint(1, 254), port=rng.randint(1024, 65535),
+            uptime=rng.randint(0, 999999), frac=rng.randint(0, 999999))
+        lines.append(line)
+        total += len(line)
+    return "".join(lines).encode()[:size]
+
+def filler(size: int, rng: random.Random) -> Iterator[bytes]:
+    """Yield `size` bytes of mixed text, high-entropy and zeroed blocks
+
+    A handful of text blocks is rendered up front and reused, so producing hundreds of
+    megabytes costs little more than writing them.
+    """
+    text_blocks = [_text_block(rng, CHUNK_SIZE) for _ in range(8)]
+    remaining = size
+    while remaining > 0:
+        n = min(CHUNK_SIZE, remaining)
+        kind = rng.random()
+        if kind < 0.6:
+            block = rng.choice(text_blocks)[:n]
+        elif kind < 0.9:
+            block = rng.randbytes(n)
+        else:
+            block = bytes(n)
+        remaining -= n
+        yield block
+
+def payload(flag: str, size: int, rng: random.Random) -> Stream:
+    """Filler with the flag planted at a random offset"""
+    marker = f"\n-- recovered note --\n{flag}\n".encode()
+    before = rng.randint(0, max(size - len(marker), 0))
+    after = max(size - len(marker) - before, 0)
+
+    def chunks() -> Iterator[bytes]:
+        yield from filler(before, rng)
+        yield marker
+        yield from filler(after, rng)
+    return chunks(), before + len(marker) + after
+
+def xor_layer(stream: Stream, key: int) -> Stream:
+    """XOR every byte with a single-byte key"""
+    chunks, size = stream
+
+    def run() -> Iterator[bytes]:
+        for chunk in chunks:
+            # Whole-chunk integer XOR instead of a Python loop per byte
+            mask = bytes([key]) * len(chunk)
+            yield (int.from_bytes(chunk, "big") ^ int.from_bytes(mask, "big")).to_bytes(len(chunk), "big")
+    return run(), size
+
+def base64_layer(stream: Stream) -> Stream:
+    """MIME-style base64 with 76-character lines"""
+    chunks, size = stream
+
+    def run() -> Iterator[bytes]:
+        pending = b""
+        for chunk in chunks:
+            pending += chunk
+            # encodebytes wraps every 57 input bytes, so only split on that boundary
+            cut = len(pending) - len(pending) % 57
+            if cut:
+                yield base64.encodebytes(pending[:cut])
+                pending = pending[cut:]
+        if pending:
+            yield base64.encodebytes(pending)
+
+    encoded = None
+    if size is not None:
+        full, rest = divmod(size, 57)
+        encoded = full * 77 + ((rest + 2) // 3 * 4 + 1 if rest else 0)
+    return run(), encoded
+
+def gzip_layer(stream: Stream) -> Stream:
+    """gzip, compressed incrementally"""
+    chunks, _ = stream
+
+    def run() -> Iterator[bytes]:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            out = compressor.compress(chunk)
+            if out:
+                yield out
+        yield compressor.flush()
+    return run(), None
+
+def _spool(stream: Stream) -> Tuple[BinaryIO, int]:
+    """Buffer a stream of unknown size in a temporary file, on disk rather than in memory"""
+    chunks, _ = stream
+    spool = tempfile.TemporaryFile()
+    size = 0
+    for chunk in chunks:
+        spool.write(chunk)
+        size += len(chunk)
+    spool.seek(0)
+    return spool, size
+
+def _tar_member(name: str, stream: Stream) -> Iterator[bytes]:
+    """One tar header, the member data and its padding"""
+    chunks, size = stream
+    spool = None
+    if size is None:
+        # Tar headers carry the size, so unknown-size layers are measured first
+        spool, size = _spool(stream)
+        chunks = iter(lambda: spool.read(CHUNK_SIZE), b"")
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mode = 0o644
+    info.mtime = 1700000000
+    yield info.tobuf(format=tarfile.GNU_FORMAT)
+    yield from chunks
+    if size % tarfile.BLOCKSIZE:
+        yield bytes(tarfile.BLOCKSIZE - size % tarfile.BLOCKSIZE)
+    if spool:
+        spool.close()
+
+def tar_layer(stream: Stream, name: str, decoys: List[Tuple[str, Stream]]) -> Stream:
+    """A tar archive holding the inner layer between decoy members"""
+    def run() -> Iterator[bytes]:
+        members = decoys[:1] + [(name, stream)] + decoys[1:]
+        for member_name, member in members:
+            yield from _tar_member(member_name, member)
+        yield bytes(2 * tarfile.BLOCKSIZE)
+    return run(), None
+
+#class for a write-only file object whose contents are taken out as they are written
+class _ChunkSink(io.RawIOBase):
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> Iterator[bytes]:
+        """Hand over everything written since the last drain"""
+        chunks, self._chunks = self._chunks, []
+        return iter(chunks)
+
+def zip_layer(stream: Stream, name: str, decoys: List[Tuple[str, Stream]]) -> Stream:
+    """A zip archive written for a non-seekable output, with data descriptors"""
+    def run() -> Iterator[bytes]:
+        # No seek() on the sink makes zipfile write sizes after each member
+        sink = _ChunkSink()
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as archive:
+            for member_name, (chunks, _) in decoys[:1] + [(name, stream)] + decoys[1:]:
+                with archive.open(member_name, "w", force_zip64=True) as member:
+                    for chunk in chunks:
+                        member.write(chunk)
+                        yield from sink.drain()
+                yield from sink.drain()
+        yield from sink.drain()
+    return run(), None
+
+def plan_layers(rng: random.Random, depth: int = 4) -> List[str]:
+    """Pick layers innermost first; the outermost one is always a container"""
+    layers = []
+    while len(layers) < depth - 1:
+        layer = rng.choice(LAYERS)
+        # Base64 over base64 or XOR over XOR adds nothing
+        if layers and layer == layers[-1] and layer in ("xor", "base64"):
+            continue
+        layers.append(layer)
+    layers.append(rng.choice(["gzip", "tar", "zip"]))
+    return layers
+
+def write_artifact(out: BinaryIO, flag: str, size: int, layers: List[str], rng: random.Random) -> List[str]:
+    """Stream a layered artifact into `out`, which only needs write(); returns how to peel it"""
+    stream = payload(flag, size, rng)
+    steps = []
+    for layer in layers:
+        if layer == "xor":
+            key = rng.randint(1, 255)
+            stream = xor_layer(stream, key)
+            steps.append(f"XOR every byte with 0x{key:02x}")
+        elif layer == "base64":
+            stream = base64_layer(stream)
+            steps.append("base64-decode")
+        elif layer == "gzip":
+            stream = gzip_layer(stream)
+            steps.append("gunzip")
+        else:
+            inner = rng.choice(["backup/disk.img", "export/dump.raw", "var/log/archive.bin", "data/blob.dat"])
+            # Decoys are small so most of the size budget goes into the layer that matters
+            decoys = []
+            for decoy in ("README.txt", "var/log/syslog.1"):
+                decoy_size = rng.randint(1024, 16384)
+                decoys.append((decoy, (filler(decoy_size, rng), decoy_size)))
+            stream = (tar_layer if layer == "tar" else zip_layer)(stream, inner, decoys)
+            steps.append(f"extract {inner} from the {layer} archive")
+    for chunk in stream[0]:
+        out.write(chunk)
+    return steps[::-1]
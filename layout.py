@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+import os
+import re
+import uuid
+import sqlite3
+import argparse
+from pathlib import Path
+from typing import Optional, List, Tuple, Iterator
+
+PREFIX = "challenge_"
+# New ids carry a full uuid4; older trees used its first 8 hex digits
+ID_PATTERN = re.compile(r"^challenge_[0-9a-f]{8,32}$")
+SHARD_PATTERN = re.compile(r"^[0-9a-f]{2}$")
+
+def is_challenge_id(challenge_id: str) -> bool:
+    """Whether a string is a well-formed generated challenge id (and safe to use in a path)"""
+    return bool(ID_PATTERN.match(challenge_id or ""))
+
+def shard_path(root: Path, challenge_id: str) -> Path:
+    """Where a challenge lives in the sharded layout: root/ab/cd/challenge_abcd..."""
+    digits = challenge_id[len(PREFIX):]
+    return Path(root) / digits[:2] / digits[2:4] / challenge_id
+
+def new_challenge_dir(root: Path) -> Path:
+    """Create a directory for a new challenge under a fresh, never reused id"""
+    while True:
+        challenge_dir = shard_path(root, f"{PREFIX}{uuid.uuid4().hex}")
+        challenge_dir.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            challenge_dir.mkdir()
+        except FileExistsError:
+            # Practically impossible with 122 random bits, but never share a directory
+            continue
+        return challenge_dir
+
+def resolve(root: Path, challenge_id: str) -> Optional[Path]:
+    """Find a challenge's directory in the sharded layout, or flat in trees not yet migrated"""
+    if not is_challenge_id(challenge_id):
+        return None
+    for candidate in (shard_path(root, challenge_id), Path(root) / challenge_id):
+        if candidate.is_dir():
+            return candidate
+    return None
+
+def _subdirs(path: Path) -> Iterator[os.DirEntry]:
+    """Directory entries of path, sorted by name"""
+    with os.scandir(path) as entries:
+        return iter(sorted((entry for entry in entries if entry.is_dir()), key=lambda entry: entry.name))
+
+def iter_challenge_dirs(root: Path) -> Iterator[Path]:
+    """Every challenge directory under root, sharded or legacy flat"""
+    root = Path(root)
+    if not root.is_dir():
+        return
+    for entry in _subdirs(root):
+        if is_challenge_id(entry.name):
+            yield Path(entry.path)
+        elif SHARD_PATTERN.match(entry.name):
+            for inner in _subdirs(Path(entry.path)):
+                if SHARD_PATTERN.match(inner.name):
+                    for challenge in _subdirs(Path(inner.path)):
+                        if is_challenge_id(challenge.name):
+                            yield Path(challenge.path)
+
+def migrate(root: Path, db_path: Optional[str] = None, dry_run: bool = False) -> List[Tuple[Path, Path]]:
+    """Move flat challenge directories into shards, keeping their ids, and repoint the catalog"""
+    root = Path(root)
+    moves = []
+    for challenge_dir in iter_challenge_dirs(root):
+        if challenge_dir.parent != root:
+            continue
+        target = shard_path(root, challenge_dir.name)
+        if target.exists():
+            print(f"Skipping {challenge_dir.name}: {target} already exists")
+            continue
+        moves.append((challenge_dir, target))
+    if dry_run:
+        return moves
+
+    conn = sqlite3.connect(db_path) if db_path and os.path.exists(db_path) else None
+    for source, target in moves:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.rename(source, target)
+        if conn:
+            directory = target.relative_to(root).as_posix()
+            conn.execute("UPDATE challenges SET directory = ? WHERE id = ? AND source = 'generated'",
+                         (directory, target.name))
+            conn.execute("UPDATE challenge_assets SET path = ? || '/' || filename WHERE challenge_id = ?",
+                         (directory, target.name))
+            # Commit per move so an interrupted migration leaves disk and catalog in step
+            conn.commit()
+    if conn:
+        conn.close()
+    return moves
+
+# Migrate or inspect a challenge tree from the command line
+def main():
+    parser = argparse.ArgumentParser(description="Sharded layout for generated challenges")
+    parser.add_argument('--dir', default='challenges', help="Generated challenges directory")
+    parser.add_argument('--db', default='ctf_platform.db', help="Platform database holding the catalog")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = subparsers.add_parser('migrate', help="Move flat challenge directories into shards")
+    migrate_parser.add_argument('--dry-run', action='store_true', help="Only list what would move")
+    resolve_parser = subparsers.add_parser('resolve', help="Print the directory of a challenge id")
+    resolve_parser.add_argument('id', help="Challenge id")
+    args = parser.parse_args()
+
+    if args.command == 'resolve':
+        challenge_dir = resolve(Path(args.dir), args.id)
+        print(challenge_dir if challenge_dir else f"No challenge {args.id}")
+        return
+
+    moves = migrate(Path(args.dir), args.db, args.dry_run)
+    for source, target in moves:
+        print(f"{source} -> {target}")
+    print(f"{'Would move' if args.dry_run else 'Moved'} {len(moves)} challenges")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+import os
+import time
+import fcntl
+import queue
+import sqlite3
+import argparse
+import datetime
+import threading
+from pathlib import Path
+from typing import Optional, Dict, List
+
+import catalog
+import layout
+from bundle import export_bundle
+from cluster import InvalidationBus
+from ctforge import _parse_size
+
+# Uploads are written before their row is inserted, so give in-flight requests time to finish
+UPLOAD_GRACE_SECONDS = 3600
+# Kept next to the database rather than in the uploads directory, where it would look orphaned
+GC_LOCK_SUFFIX = ".gc.lock"
+
+def find_orphans(uploads_dir: str = "custom_challenges", db_path: str = "ctf_platform.db",
+                 grace: int = UPLOAD_GRACE_SECONDS) -> Dict[str, List[str]]:
+    """Reconcile challenge_files against the uploads directory"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute('SELECT id, challenge_id, filename, file_path FROM challenge_files')
+    file_rows = cursor.fetchall()
+    conn.close()
+
+    referenced = {row[2] for row in file_rows}
+    cutoff = time.time() - grace
+    unreferenced = []
+    if os.path.isdir(uploads_dir):
+        with os.scandir(uploads_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name not in referenced and entry.stat().st_mtime < cutoff:
+                    unreferenced.append(entry.path)
+
+    # file_path is relative to wherever the web app runs, so look the file up under uploads_dir instead
+    dangling = [str(row[0]) for row in file_rows if not os.path.exists(os.path.join(uploads_dir, row[2]))]
+    return {"unreferenced_files": sorted(unreferenced), "dangling_rows": dangling}
+
+def find_retired(db_path: str = "ctf_platform.db", older_than_days: Optional[int] = None,
+                 include_rejected: bool = True) -> List[str]:
+    """List challenge ids due for archival: rejected custom challenges and old generated ones"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    retired = []
+    if include_rejected:
+        cursor.execute("SELECT id FROM custom_challenges WHERE status = 'rejected'")
+        retired.extend(row[0] for row in cursor.fetchall())
+    if older_than_days is not None:
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=older_than_days)
+        cursor.execute("SELECT id FROM challenges WHERE source = 'generated' AND created_at < ?",
+                       (cutoff.isoformat(sep=" ", timespec="seconds"),))
+        retired.extend(row[0] for row in cursor.fetchall())
+    conn.close()
+    return retired
+
+#class that deletes files in the background at a bounded rate
+class Reclaimer:
+    def __init__(self, max_bytes_per_sec: int = 20 * 1024 * 1024, max_files_per_sec: int = 200):
+        self.max_bytes_per_sec = max_bytes_per_sec
+        self.max_files_per_sec = max_files_per_sec
+        self.reclaimed_bytes = 0
+        self.reclaimed_files = 0
+        self._queue: "queue.Queue[Path]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def enqueue(self, path: str) -> None:
+        """Schedule a file or directory tree for deletion"""
+        self._queue.put(Path(path))
+
+    def _unlink(self, path: Path) -> None:
+        """Delete one file, then sleep long enough to stay under the configured rate"""
+        size = path.stat().st_size
+        path.unlink()
+        self.reclaimed_bytes += size
+        self.reclaimed_files += 1
+        time.sleep(max(size / self.max_bytes_per_sec, 1 / self.max_files_per_sec))
+
+    def _delete(self, path: Path) -> None:
+        """Delete a file or a directory tree, file by file"""
+        if path.is_dir():
+            for root, dirs, files in os.walk(path, topdown=False):
+                for name in files:
+                    self._unlink(Path(root) / name)
+                for name in dirs:
+                    os.rmdir(os.path.join(root, name))
+            path.rmdir()
+        elif path.exists():
+            self._unlink(path)
+
+    def drain(self) -> None:
+        """Delete everything queued so far in the calling thread"""
+        while True:
+            try:
+                path = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                self._delete(path)
+            except OSError as e:
+                print(f"Error reclaiming {path}: {e}")
+
+    def _run(self) -> None:
+        """Background loop that deletes queued paths one at a time"""
+        while True:
+            path = self._queue.get()
+            try:
+                self._delete(path)
+            except OSError as e:
+                print(f"Error reclaiming {path}: {e}")
+
+    def start(self) -> None:
+        """Start the background deleter once"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+def _forget(db_path: str, challenge_ids: List[str], dangling_rows: List[str],
+            orphaned_uploads: Optional[List[str]] = None) -> None:
+    """Remove retired challenges, dangling file rows and the catalog assets of both from the database in one transaction"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    for challenge_id in challenge_ids:
+        cursor.execute('DELETE FROM challenge_files WHERE challenge_id = ?', (challenge_id,))
+        cursor.execute('DELETE FROM custom_challenges WHERE id = ?', (challenge_id,))
+        catalog.remove(cursor, challenge_id)
+    missing = [os.path.basename(path) for path in orphaned_uploads or []]
+    for row_id in dangling_rows:
+        row = cursor.execute('SELECT filename FROM challenge_files WHERE id = ?', (row_id,)).fetchone()
+        if row:
+            missing.append(row[0])
+        cursor.execute('DELETE FROM challenge_files WHERE id = ?', (row_id,))
+    # The catalog lists uploads too; an asset whose file is gone would 404 on download and preview
+    catalog.remove_uploads(cursor, missing)
+    conn.commit()
+    conn.close()
+
+    if challenge_ids:
+        # Tell running web app workers to drop their cached listings
+        bus = InvalidationBus(os.environ.get('CTF_BUS_DB', 'ctf_bus.db'))
+        for challenge_id in challenge_ids:
+            bus.publish('challenge_removed', {'id': challenge_id}, key=challenge_id)
+
+def archive_challenges(challenge_ids: List[str], reclaimer: Reclaimer, archive_dir: str = "archive",
+                       challenges_dir: str = "challenges", uploads_dir: str = "custom_challenges",
+                       db_path: str = "ctf_platform.db") -> Optional[str]:
+    """Bundle retired challenges into a compressed archive, then schedule their files for deletion"""
+    if not challenge_ids:
+        return None
+    os.makedirs(archive_dir, exist_ok=True)
+    stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    archive_path = os.path.join(archive_dir, f"retired_{stamp}.tar.gz")
+    export_bundle(archive_path, challenges_dir, uploads_dir, db_path, only=set(challenge_ids))
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    placeholders = ", ".join("?" for _ in challenge_ids)
+    cursor.execute(f'SELECT filename FROM challenge_files WHERE challenge_id IN ({placeholders})', challenge_ids)
+    upload_paths = [os.path.join(uploads_dir, row[0]) for row in cursor.fetchall()]
+    conn.close()
+
+    # Forget first so nothing serves a file that is about to disappear
+    _forget(db_path, challenge_ids, [])
+    for challenge_id in challenge_ids:
+        challenge_dir = layout.resolve(Path(challenges_dir), challenge_id)
+        if challenge_dir:
+            reclaimer.enqueue(str(challenge_dir))
+    for upload_path in upload_paths:
+        reclaimer.enqueue(upload_path)
+    return archive_path
+
+def collect_garbage(reclaimer: Reclaimer, uploads_dir: str = "custom_challenges",
+                    db_path: str = "ctf_platform.db") -> Dict[str, List[str]]:
+    """Drop dangling file rows and schedule unreferenced uploads for deletion, with their catalog assets"""
+    orphans = find_orphans(uploads_dir, db_path)
+    if orphans["dangling_rows"] or orphans["unreferenced_files"]:
+        _forget(db_path, [], orphans["dangling_rows"], orphans["unreferenced_files"])
+    for path in orphans["unreferenced_files"]:
+        reclaimer.enqueue(path)
+    return orphans
+
+#class that runs garbage collection periodically next to the web app
+class LifecycleManager:
+    def __init__(self, uploads_dir: str = "custom_challenges", db_path: str = "ctf_platform.db",
+                 max_bytes_per_sec: int = 20 * 1024 * 1024):
+        self.uploads_dir = uploads_dir
+        self.db_path = db_path
+        self.reclaimer = Reclaimer(max_bytes_per_sec)
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self, interval: float) -> None:
+        """Collect garbage every `interval` seconds; only the process holding the lock file does any work"""
+        lock_file = open(f"{self.db_path}{GC_LOCK_SUFFIX}", "w")
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                # Another worker collects; take over if it goes away
+                time.sleep(interval)
+
+        while True:
+            try:
+                collect_garbage(self.reclaimer, self.uploads_dir, self.db_path)
+            except (OSError, sqlite3.Error) as e:
+                print(f"Error collecting garbage: {e}")
+            time.sleep(interval)
+
+    def start(self, interval: float = 3600.0) -> None:
+        """Start periodic collection and the rate-limited deleter"""
+        if self._thread is None:
+            self.reclaimer.start()
+            self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+            self._thread.start()
+
+# Parse arguments and run a lifecycle task
+def main():
+    parser = argparse.ArgumentParser(description="Archive retired challenges and reclaim storage")
+    parser.add_argument('--challenges', default='challenges', help="Generated challenges directory")
+    parser.add_argument('--uploads', default='custom_challenges', help="Custom challenge uploads directory")
+    parser.add_argument('--db', default='ctf_platform.db', help="Platform database")
+    parser.add_argument('--rate', default='20M', help="Maximum deletion rate in bytes per second")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('scan', help="Report orphaned uploads and dangling file rows")
+    subparsers.add_parser('gc', help="Delete orphaned uploads and dangling file rows")
+    archive_parser = subparsers.add_parser('archive', help="Archive and delete retired challenges")
+    archive_parser.add_argument('ids', nargs='*', help="Challenge ids to retire explicitly")
+    archive_parser.add_argument('--older-than', type=int, help="Also retire generated challenges older than N days")
+    archive_parser.add_argument('--no-rejected', action='store_true', help="Keep rejected custom challenges")
+    archive_parser.add_argument('--archive-dir', default='archive', help="Where to write archive bundles")
+    args = parser.parse_args()
+
+    reclaimer = Reclaimer(_parse_size(args.rate))
+    if args.command == 'scan':
+        orphans = find_orphans(args.uploads, args.db)
+        retired = find_retired(args.db)
+        print(f"Unreferenced uploads: {len(orphans['unreferenced_files'])}")
+        for path in orphans['unreferenced_files']:
+            print(f"  {path}")
+        print(f"Dangling file rows: {len(orphans['dangling_rows'])}")
+        print(f"Rejected challenges awaiting archival: {len(retired)}")
+        return
+
+    if args.command == 'gc':
+        orphans = collect_garbage(reclaimer, args.uploads, args.db)
+        print(f"Dropped {len(orphans['dangling_rows'])} dangling rows")
+    else:
+        ids = list(dict.fromkeys(args.ids + find_retired(args.db, args.older_than, not args.no_rejected)))
+        archive_path = archive_challenges(ids, reclaimer, args.archive_dir, args.challenges, args.uploads, args.db)
+        print(f"Archived {len(ids)} challenges to {archive_path}" if archive_path else "Nothing to archive")
+
+    reclaimer.drain()
+    print(f"Reclaimed {reclaimer.reclaimed_files} files, {reclaimer.reclaimed_bytes} bytes")
+
+if __name__ == '__main__':
+    main()
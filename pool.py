@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import datetime
+import fcntl
+import random
+import shutil
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict, List, Tuple
+
+import layout
+from ctforge import ChallengeGenerator, ChallengeType, SUBTYPES, MANIFEST_NAME
+
+# Half-built challenges live here until they are complete
+BUILDING_DIR = ".building"
+LOCK_NAME = ".refill.lock"
+
+def pool_slots() -> List[Tuple[str, str]]:
+    """Every (category, subtype) the pool keeps challenges for"""
+    return [(family.name.lower(), subtype.name.lower())
+            for family, subtypes in SUBTYPES.items() for subtype in subtypes]
+
+def build_into_pool(pool_dir: str, category: str, subtype: str) -> str:
+    """Generate one challenge and move it into its pool slot once it is complete"""
+    family = ChallengeType[category.upper()]
+    building = Path(pool_dir) / BUILDING_DIR
+    building.mkdir(parents=True, exist_ok=True)
+    info = ChallengeGenerator().generate_challenge(family, building, SUBTYPES[family][subtype.upper()])
+    slot = Path(pool_dir) / category / subtype
+    slot.mkdir(parents=True, exist_ok=True)
+    target = slot / Path(info["directory"]).name
+    os.rename(info["directory"], target)
+    try:
+        # Drop the now empty shard directories under .building
+        os.removedirs(Path(info["directory"]).parent)
+    except OSError:
+        pass
+    return str(target)
+
+#class for a pool of ready-made challenges that /generate can hand out instantly
+class ChallengePool:
+    def __init__(self, pool_dir: Path, challenges_dir: Path, depth: int = 1,
+                 max_load: float = 0.75, pause: float = 1.0):
+        self.pool_dir = Path(pool_dir)
+        self.challenges_dir = Path(challenges_dir)
+        self.depth = depth
+        self.max_load = max_load
+        self.pause = pause
+        self._wake = threading.Event()
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _slot_entries(self, category: str, subtype: str) -> List[os.DirEntry]:
+        """Ready challenges in one slot"""
+        slot = self.pool_dir / category / subtype
+        if not slot.is_dir():
+            return []
+        with os.scandir(slot) as entries:
+            return [entry for entry in entries if entry.is_dir()]
+
+    def levels(self) -> Dict[str, int]:
+        """How many ready challenges each slot holds"""
+        return {f"{category}/{subtype}": len(self._slot_entries(category, subtype))
+                for category, subtype in pool_slots()}
+
+    def claim(self, category: str, subtype: Optional[str] = None) -> Optional[Path]:
+        """Move a ready challenge into its shard of the challenges directory and return its new path
+
+        The rename is atomic, so two workers can never claim the same challenge.
+        Returns None when the matching slots are empty.
+        """
+        subtypes = [subtype] if subtype else [name for slot_category, name in pool_slots() if slot_category == category]
+        random.shuffle(subtypes)
+        for name in subtypes:
+            for entry in self._slot_entries(category, name):
+                target = layout.shard_path(self.challenges_dir, entry.name)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    os.rename(entry.path, target)
+                except FileNotFoundError:
+                    # Another worker got it first
+                    continue
+                self._stamp(target)
+                self._wake.set()
+                return target
+        return None
+
+    def _stamp(self, challenge_dir: Path) -> None:
+        """Date a claimed challenge from when it was handed out, not when it was built"""
+        manifest_path = challenge_dir / MANIFEST_NAME
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        manifest["created_at"] = datetime.datetime.utcnow().isoformat(sep=" ", timespec="seconds")
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+
+    def _busy(self) -> bool:
+        """Whether the host is loaded enough that refilling should wait"""
+        try:
+            return os.getloadavg()[0] / (os.cpu_count() or 1) > self.max_load
+        except OSError:
+            return False
+
+    def _clean_building(self, older_than: float = 3600.0) -> None:
+        """Remove challenges left half-built by a crashed refiller"""
+        building = self.pool_dir / BUILDING_DIR
+        if not building.is_dir():
+            return
+        cutoff = time.time() - older_than
+        for entry in building.iterdir():
+            if entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry, ignore_errors=True)
+
+    def refill(self, executor: Optional[ProcessPoolExecutor] = None) -> int:
+        """Build challenges until every slot holds `depth`, emptiest slot first; returns how many were built"""
+        built = 0
+        while True:
+            levels = self.levels()
+            slot, level = min(levels.items(), key=lambda item: item[1])
+            if level >= self.depth:
+                return built
+            category, subtype = slot.split("/")
+            if executor:
+                executor.submit(build_into_pool, str(self.pool_dir), category, subtype).result()
+            else:
+                build_into_pool(str(self.pool_dir), category, subtype)
+            built += 1
+            if executor:
+                # Leave the CPU to request handlers between builds, and back off while they are busy
+                time.sleep(self.pause)
+                while self._busy():
+                    time.sleep(self.pause * 5)
+
+    def _run(self, interval: float) -> None:
+        """Refill in the background; only the process holding the lock file does any work"""
+        self.pool_dir.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.pool_dir / LOCK_NAME, "w")
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                # Another worker refills; take over if it goes away
+                time.sleep(interval)
+
+        self._clean_building()
+        # Build in a separate process so generation never holds this worker's GIL
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            while True:
+                try:
+                    self.refill(executor)
+                except Exception as e:
+                    print(f"Error refilling challenge pool: {e}")
+                self._wake.wait(interval)
+                self._wake.clear()
+
+    def start(self, interval: float = 5.0) -> None:
+        """Start the refiller in this process; safe to call on every request and after fork"""
+        if self.depth <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(target=self._run, args=(interval,), daemon=True).start()
+            self._pid = os.getpid()
+
+# Fill or inspect the pool from the command line
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate challenges for instant /generate")
+    parser.add_argument('--pool', default='challenge_pool', help="Pool directory")
+    parser.add_argument('--challenges', default='challenges', help="Generated challenges directory")
+    parser.add_argument('--depth', type=int, default=1, help="Ready challenges to keep per subtype")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('fill', help="Build challenges until every subtype is at depth")
+    subparsers.add_parser('status', help="Show how many challenges each subtype holds")
+    args = parser.parse_args()
+
+    pool = ChallengePool(Path(args.pool), Path(args.challenges), args.depth)
+    if args.command == 'fill':
+        print(f"Built {pool.refill()} challenges")
+    for slot, level in pool.levels().items():
+        print(f"{slot:<30} {level}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+import os
+import time
+import shutil
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, Future, TimeoutError
+from typing import Optional, Dict, List, Tuple, BinaryIO
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Bump whenever a preview format changes, so previews made by older code are never served
+PREVIEW_VERSION = 1
+THUMBNAIL_SIZE = (320, 320)
+PACKET_LIMIT = 50
+HEXDUMP_BYTES = 1024
+TEXT_BYTES = 4096
+# Hits refresh a preview's mtime, which eviction orders by, at most this often
+TOUCH_INTERVAL = 3600
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp', '.tif', '.tiff'}
+PCAP_EXTENSIONS = {'.pcap', '.pcapng', '.cap'}
+PNG_MAGIC = b'\x89PNG\r\n\x1a\n'
+
+def preview_kind(filename: str) -> str:
+    """Which preview a file gets, from its name: thumbnail, packets or head"""
+    suffix = Path(filename).suffix.lower()
+    if suffix in IMAGE_EXTENSIONS and Image is not None:
+        return 'thumbnail'
+    if suffix in PCAP_EXTENSIONS:
+        return 'packets'
+    return 'head'
+
+def _thumbnail(source: str, out: BinaryIO) -> None:
+    """A PNG no larger than THUMBNAIL_SIZE"""
+    with Image.open(source) as image:
+        # Lets JPEG decode at a reduced scale instead of at full size
+        image.draft('RGB', THUMBNAIL_SIZE)
+        image.thumbnail(THUMBNAIL_SIZE)
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+        # Copy only the pixels: EXIF and text chunks are where metadata challenges hide their flag
+        clean = Image.frombytes(image.mode, image.size, image.tobytes())
+        clean.save(out, 'PNG')
+
+def _packets(source: str, out: BinaryIO) -> None:
+    """One summary line per packet for the first PACKET_LIMIT packets"""
+    # scapy takes a second to import, so only the preview workers load it
+    from scapy.all import PcapReader
+
+    lines = []
+    with PcapReader(source) as reader:
+        for number, packet in enumerate(reader, 1):
+            if number > PACKET_LIMIT:
+                lines.append(f"... more packets in the full capture ({os.path.getsize(source)} bytes)")
+                break
+            timestamp = time.strftime('%H:%M:%S', time.gmtime(float(packet.time)))
+            lines.append(f"{number:>4}  {timestamp}  {len(packet):>6}  {packet.summary()}")
+    out.write(('\n'.join(lines or ['No packets']) + '\n').encode())
+
+def _hexdump(data: bytes) -> str:
+    """Offset, hex and ASCII columns, 16 bytes per line"""
+    lines = []
+    for offset in range(0, len(data), 16):
+        row = data[offset:offset + 16]
+        hex_part = ' '.join(f"{b:02x}" for b in row)
+        ascii_part = ''.join(chr(b) if 32 <= b < 127 else '.' for b in row)
+        lines.append(f"{offset:08x}  {hex_part:<47}  |{ascii_part}|")
+    return '\n'.join(lines)
+
+def _head(source: str, out: BinaryIO) -> None:
+    """The start of a file: as text when it is text, as a hex dump otherwise"""
+    size = os.path.getsize(source)
+    with open(source, 'rb') as f:
+        data = f.read(TEXT_BYTES)
+    text = None
+    if b'\0' not in data:
+        try:
+            text = data.decode('utf-8')
+        except UnicodeDecodeError as e:
+            # A multi-byte character cut in half at the end is still text
+            if e.start >= len(data) - 3:
+                text = data[:e.start].decode('utf-8')
+    if text is not None:
+        shown = len(data)
+    else:
+        shown = min(size, HEXDUMP_BYTES)
+        text = _hexdump(data[:shown])
+    if size > shown:
+        text += f"\n... {size - shown} more bytes"
+    out.write((text.rstrip('\n') + '\n').encode())
+
+RENDERERS = {'thumbnail': _thumbnail, 'packets': _packets, 'head': _head}
+
+def render_preview(kind: str, source: str, target: str) -> int:
+    """Derive a preview of source into target and return its size; runs in a pool worker"""
+    Path(target).parent.mkdir(parents=True, exist_ok=True)
+    partial = f"{target}.{os.getpid()}.tmp"
+    try:
+        with open(partial, 'wb') as out:
+            try:
+                RENDERERS[kind](source, out)
+            except Exception:
+                if kind == 'head':
+                    raise
+                # Not what its name claims; the head still shows what it is
+                out.seek(0)
+                out.truncate()
+                _head(source, out)
+        # Other workers may render the same preview; whichever lands last wins, and both are complete
+        os.replace(partial, target)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return os.path.getsize(target)
+
+def preview_mimetype(path: Path) -> str:
+    """Content type of a cached preview, which is either a PNG thumbnail or text"""
+    with open(path, 'rb') as f:
+        return 'image/png' if f.read(len(PNG_MAGIC)) == PNG_MAGIC else 'text/plain; charset=utf-8'
+
+#class for previews cached on disk by content hash, generated in a process pool and evicted least recently used first
+class PreviewCache:
+    def __init__(self, cache_dir: Path, max_bytes: int = 256 * 1024 * 1024, workers: int = 2):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+        # Estimated bytes on disk; a full scan corrects it whenever it crosses the limit
+        self._size: Optional[int] = None
+
+    def path_for(self, sha256: str, kind: str) -> Path:
+        """Where the preview of a file with this hash lives"""
+        return self.cache_dir / sha256[:2] / f"{sha256}-{kind}-v{PREVIEW_VERSION}"
+
+    def lookup(self, sha256: str, kind: str) -> Optional[Path]:
+        """A cached preview, marked as recently used, or None"""
+        path = self.path_for(sha256, kind)
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        if time.time() - mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return path
+
+    def _pool(self) -> ProcessPoolExecutor:
+        """The render pool of this process, created on first use and again after fork"""
+        if self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._pending = {}
+            self._pid = os.getpid()
+        return self._executor
+
+    def request(self, source: Path, sha256: str, kind: Optional[str] = None) -> Future:
+        """Render a preview in the background unless the same one is already being rendered"""
+        kind = kind or preview_kind(str(source))
+        target = str(self.path_for(sha256, kind))
+        with self._lock:
+            future = self._pending.get(target)
+            if future is not None:
+                return future
+            future = self._pool().submit(render_preview, kind, str(source), target)
+            self._pending[target] = future
+        # Outside the lock: a future that is already done runs the callback right here
+        future.add_done_callback(lambda done: self._finished(target, done))
+        return future
+
+    def _finished(self, target: str, future: Future) -> None:
+        """Count a rendered preview against the limit and evict if it is exceeded"""
+        with self._lock:
+            self._pending.pop(target, None)
+        if future.cancelled() or future.exception():
+            return
+        if self._size is None:
+            self._size = self.usage()[1]
+        else:
+            self._size += future.result()
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def get(self, source: Path, sha256: str, wait: float = 5.0) -> Optional[Path]:
+        """The preview of a file, rendering it first if needed; None if that takes longer than `wait`"""
+        kind = preview_kind(str(source))
+        path = self.lookup(sha256, kind)
+        if path:
+            return path
+        future = self.request(source, sha256, kind)
+        try:
+            future.result(timeout=wait)
+        except TimeoutError:
+            return None
+        except Exception as e:
+            print(f"Error generating preview of {source}: {e}")
+            return None
+        return self.lookup(sha256, kind)
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """(mtime, size, path) of every cached preview"""
+        entries = []
+        if not self.cache_dir.is_dir():
+            return entries
+        with os.scandir(self.cache_dir) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as files:
+                    for entry in files:
+                        if entry.name.endswith('.tmp'):
+                            continue
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def usage(self) -> Tuple[int, int]:
+        """Number of cached previews and the bytes they take"""
+        entries = self._entries()
+        return len(entries), sum(size for _, size, _ in entries)
+
+    def evict(self, low_water: float = 0.9) -> int:
+        """Delete least recently used previews until the cache is under low_water of its limit"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes * low_water:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        self._size = total
+        return removed
+
+    def clear(self) -> None:
+        """Delete every cached preview"""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        self._size = 0
+
+def catalog_assets(db_path: str, challenges_dir: Path) -> List[Tuple[Path, str]]:
+    """(path, sha256) of every hashed file in the catalog; generated asset paths are relative to challenges_dir"""
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute('''
+        SELECT a.path, a.sha256, c.source FROM challenge_assets a
+        JOIN challenges c ON a.challenge_id = c.id
+        WHERE a.sha256 IS NOT NULL
+    ''').fetchall()
+    conn.close()
+    return [(challenges_dir / path if source == 'generated' else Path(path), sha256) for path, sha256, source in rows]
+
+# Inspect, warm or trim the preview cache from the command line
+def main():
+    parser = argparse.ArgumentParser(description="Thumbnail and preview cache for challenge files")
+    parser.add_argument('--dir', default='preview_cache', help="Preview cache directory")
+    parser.add_argument('--max-mb', type=int, default=256, help="Cache size limit in MB")
+    parser.add_argument('--db', default='ctf_platform.db', help="Platform database holding the catalog")
+    parser.add_argument('--challenges', default='challenges', help="Generated challenges directory")
+    parser.add_argument('--workers', type=int, default=2, help="Render processes for warm")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help="Show how many previews are cached and their size")
+    subparsers.add_parser('warm', help="Render previews of every catalogued file ahead of time")
+    subparsers.add_parser('evict', help="Trim the cache to its size limit")
+    subparsers.add_parser('clear', help="Delete every cached preview")
+    args = parser.parse_args()
+
+    cache = PreviewCache(Path(args.dir), args.max_mb * 1024 * 1024, args.workers)
+    if args.command == 'warm':
+        try:
+            assets = catalog_assets(args.db, Path(args.challenges))
+        except sqlite3.OperationalError as e:
+            print(f"Error reading the catalog in {args.db} (start the web app once to create it): {e}")
+            return
+        # Identical files uploaded twice share one preview
+        wanted = {(sha256, preview_kind(str(path))): path for path, sha256 in assets if path.exists()}
+        futures = [cache.request(path, sha256, kind) for (sha256, kind), path in wanted.items()
+                   if not cache.lookup(sha256, kind)]
+        failed = 0
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Error generating preview: {e}")
+        print(f"Rendered {len(futures) - failed} previews")
+    elif args.command == 'evict':
+        print(f"Evicted {cache.evict()} previews")
+    elif args.command == 'clear':
+        cache.clear()
+    count, size = cache.usage()
+    print(f"{count} previews, {size / 1024 / 1024:.1f} MB of {args.max_mb} MB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+import sys
+import pickle
+import argparse
+import tracemalloc
+from typing import Dict, Any, List, Tuple, Iterable, Mapping
+
+#class for compact, fixed-field records that still read like the dicts they replace
+class Record:
+    __slots__ = ()
+    # Values for fields left out of the constructor; mutable defaults are copied
+    _defaults: Dict[str, Any] = {}
+
+    def __init__(self, **fields: Any):
+        for name in self.__slots__:
+            if name in fields:
+                value = fields.pop(name)
+            else:
+                value = self._defaults.get(name)
+                if isinstance(value, (list, dict)):
+                    value = type(value)(value)
+            object.__setattr__(self, name, value)
+        if fields:
+            raise TypeError(f"{type(self).__name__} has no fields {', '.join(sorted(fields))}")
+
+    @classmethod
+    def from_mapping(cls, data: Mapping[str, Any]):
+        """Build a record from a dict or sqlite3.Row, ignoring keys that are not fields"""
+        keys = data.keys()
+        return cls(**{name: data[name] for name in cls.__slots__ if name in keys})
+
+    @classmethod
+    def from_rows(cls, cursor) -> List[Any]:
+        """Map every remaining row of an executed cursor by column name, not position"""
+        columns = [column[0] for column in cursor.description]
+        index = [(name, columns.index(name)) for name in cls.__slots__ if name in columns]
+        return [cls(**{name: row[i] for name, i in index}) for row in cursor.fetchall()]
+
+    @classmethod
+    def from_tuple(cls, values: Iterable[Any]):
+        """Inverse of to_tuple"""
+        record = cls.__new__(cls)
+        for name, value in zip(cls.__slots__, values):
+            object.__setattr__(record, name, value)
+        return record
+
+    def to_tuple(self) -> Tuple[Any, ...]:
+        """Field values in declaration order; the cheapest form for caches and IPC"""
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Field values keyed by name, for JSON"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def replace(self, **changes: Any):
+        """Copy with some fields changed"""
+        record = type(self).from_tuple(self.to_tuple())
+        for name, value in changes.items():
+            record[name] = value
+        return record
+
+    def __reduce__(self):
+        # Pickle as a plain tuple instead of a per-instance slot dict
+        return (type(self).from_tuple, (self.to_tuple(),))
+
+    # Mapping-style access keeps templates and older callers working unchanged
+    def __getitem__(self, name: str) -> Any:
+        if name not in self.__slots__:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __setitem__(self, name: str, value: Any) -> None:
+        if name not in self.__slots__:
+            raise KeyError(name)
+        object.__setattr__(self, name, value)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.__slots__ and getattr(self, name) is not None
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """dict.get for fields; unset fields count as missing"""
+        value = getattr(self, name, None) if name in self.__slots__ else None
+        return default if value is None else value
+
+    def keys(self) -> Tuple[str, ...]:
+        return self.__slots__
+
+    def __eq__(self, other: Any) -> bool:
+        return type(other) is type(self) and other.to_tuple() == self.to_tuple()
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+#class for what ChallengeGenerator.generate_challenge returns
+class ChallengeInfo(Record):
+    __slots__ = ("id", "flag", "directory", "type", "category", "subtype", "hint", "files", "tools",
+                 "solution_script", "setup_commands", "run_command", "created_at", "manifest")
+    _defaults = {"files": [], "tools": [], "hint": ""}
+
+#class for one row of the challenge catalog
+class CatalogEntry(Record):
+    __slots__ = ("id", "source", "category", "subtype", "title", "description", "hint", "author",
+                 "directory", "status", "created_at")
+
+#class for a generated challenge as shown to one player
+class GeneratedChallenge(Record):
+    __slots__ = ("id", "name", "path", "category", "subtype", "description", "files", "live", "solved")
+    _defaults = {"files": [], "live": False, "solved": False}
+
+#class for a file uploaded with a custom challenge
+class ChallengeFile(Record):
+    __slots__ = ("filename", "original_filename", "sha256")
+
+#class for a user-submitted challenge and its review state
+class CustomChallenge(Record):
+    __slots__ = ("id", "title", "description", "category", "flag", "author", "status", "created_at",
+                 "reviewed_by", "reviewed_at", "review_notes", "files", "solved")
+    _defaults = {"files": [], "solved": False}
+
+def _sample_row(i: int) -> Dict[str, Any]:
+    """A catalog row shaped like the real ones"""
+    return {
+        "id": f"challenge_{i:032x}", "source": "generated", "category": "crypto", "subtype": "vigenere",
+        "title": f"Challenge {i:032x}", "description": "# Crypto Challenge: vigenere\n\n**Hint**: ...",
+        "hint": "The flag is encrypted using a Vigenère cipher.", "author": None,
+        "directory": f"challenge_{i:032x}", "status": "published", "created_at": "2026-01-01 00:00:00",
+    }
+
+def _measure(build) -> Tuple[int, Any]:
+    """Bytes allocated by build() and still alive afterwards"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+def benchmark(count: int) -> Dict[str, Dict[str, float]]:
+    """Compare catalog rows held as dicts and as records; the shared strings are built first"""
+    rows = [_sample_row(i) for i in range(count)]
+    dict_bytes, dicts = _measure(lambda: [dict(row) for row in rows])
+    record_bytes, records = _measure(lambda: [CatalogEntry.from_mapping(row) for row in rows])
+    return {
+        "dict": {"bytes_per_item": dict_bytes / count, "pickled_bytes": len(pickle.dumps(dicts, protocol=pickle.HIGHEST_PROTOCOL)) / count},
+        "record": {"bytes_per_item": record_bytes / count, "pickled_bytes": len(pickle.dumps(records, protocol=pickle.HIGHEST_PROTOCOL)) / count},
+        "shallow": {"dict": sys.getsizeof(dicts[0]), "record": sys.getsizeof(records[0])},
+    }
+
+# Run the memory benchmark from the command line
+def main():
+    parser = argparse.ArgumentParser(description="Compare memory use of dict and slotted challenge records")
+    parser.add_argument('--count', type=int, default=50000, help="Number of catalog rows to hold")
+    args = parser.parse_args()
+
+    results = benchmark(args.count)
+    print(f"{args.count} catalog rows")
+    for kind in ("dict", "record"):
+        print(f"  {kind:<7} {results[kind]['bytes_per_item']:8.1f} bytes/row in memory, "
+              f"{results[kind]['pickled_bytes']:8.1f} bytes/row pickled")
+    print(f"  shallow object size: dict {results['shallow']['dict']} bytes, record {results['shallow']['record']} bytes")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import atexit
+import sqlite3
+import argparse
+import threading
+from collections import deque, Counter
+from typing import Optional, Dict, Any, List, Tuple
+
+# Solve curves are precomputed into buckets of this many seconds
+CURVE_BUCKET_SECONDS = 300
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS submissions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user TEXT NOT NULL,
+        challenge_id TEXT NOT NULL,
+        challenge_type TEXT NOT NULL,
+        correct INTEGER NOT NULL,
+        submitted_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS solves (
+        user TEXT NOT NULL,
+        challenge_id TEXT NOT NULL,
+        solved_at REAL NOT NULL,
+        PRIMARY KEY (user, challenge_id)
+    );
+    CREATE TABLE IF NOT EXISTS challenge_stats (
+        challenge_id TEXT PRIMARY KEY,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        failures INTEGER NOT NULL DEFAULT 0,
+        solves INTEGER NOT NULL DEFAULT 0,
+        first_blood_user TEXT,
+        first_blood_at REAL
+    );
+    CREATE TABLE IF NOT EXISTS solve_curve (
+        challenge_id TEXT NOT NULL,
+        bucket INTEGER NOT NULL,
+        solves INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (challenge_id, bucket)
+    );
+    CREATE TABLE IF NOT EXISTS user_attempts (
+        user TEXT NOT NULL,
+        challenge_id TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        failures INTEGER NOT NULL DEFAULT 0,
+        last_at REAL,
+        PRIMARY KEY (user, challenge_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_user_attempts_failures ON user_attempts (failures);
+'''
+
+Submission = Tuple[str, str, str, int, float]
+
+#class that buffers flag submissions in memory and writes them in batches
+class SubmissionLog:
+    def __init__(self, db_path: str = 'ctf_submissions.db', capacity: int = 100000, batch_size: int = 5000,
+                 flush_interval: float = 1.0, log_path: Optional[str] = None):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.log_path = log_path
+        self.dropped = 0
+        self.rejected = 0
+        self.flushed = 0
+        # Appends and pops on a deque are atomic, so the request path takes no lock
+        self._buffer: "deque[Submission]" = deque(maxlen=capacity)
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection that waits out other workers' flushes"""
+        return sqlite3.connect(self.db_path, timeout=10.0)
+
+    def _init_db(self) -> None:
+        """Create the log and analytics tables in WAL mode so readers never block the flusher"""
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        conn.commit()
+        conn.close()
+
+    @property
+    def pending(self) -> int:
+        """Number of submissions waiting to be written"""
+        return len(self._buffer)
+
+    def record(self, user: str, challenge_id: str, challenge_type: str, correct: bool) -> None:
+        """Queue one attempt; never touches the database"""
+        if len(self._buffer) == self._buffer.maxlen:
+            # The oldest entry is about to be overwritten
+            self.dropped += 1
+        self._buffer.append((user, challenge_id, challenge_type, int(correct), time.time()))
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    def _take(self) -> List[Submission]:
+        """Pop up to one batch from the buffer"""
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._buffer.popleft())
+            except IndexError:
+                break
+        return batch
+
+    def _write(self, batch: List[Submission]) -> None:
+        """Append a batch and fold it into the analytics tables in one transaction"""
+        conn = self._connect()
+        try:
+            self._insert(conn, batch)
+            conn.commit()
+        except sqlite3.Error:
+            # Release the write lock at once, or every other worker's flush times out behind it
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        if self.log_path:
+            with open(self.log_path, 'a') as f:
+                f.writelines(json.dumps({'user': user, 'challenge_id': challenge_id, 'challenge_type': challenge_type,
+                                         'correct': bool(correct), 'submitted_at': submitted_at}) + '\n'
+                             for user, challenge_id, challenge_type, correct, submitted_at in batch)
+
+    def _insert(self, conn: sqlite3.Connection, batch: List[Submission]) -> None:
+        """Run the statements of one batch on an open transaction"""
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO submissions (user, challenge_id, challenge_type, correct, submitted_at) VALUES (?, ?, ?, ?, ?)
+        ''', batch)
+
+        attempts: Counter = Counter()
+        failures: Counter = Counter()
+        last_at: Dict[Tuple[str, str], float] = {}
+        first_solves = []
+        for user, challenge_id, _, correct, submitted_at in batch:
+            attempts[(user, challenge_id)] += 1
+            last_at[(user, challenge_id)] = submitted_at
+            if not correct:
+                failures[(user, challenge_id)] += 1
+                continue
+            # Only a user's first correct submission counts as a solve
+            cursor.execute('INSERT OR IGNORE INTO solves (user, challenge_id, solved_at) VALUES (?, ?, ?)',
+                           (user, challenge_id, submitted_at))
+            if cursor.rowcount:
+                first_solves.append((user, challenge_id, submitted_at))
+
+        cursor.executemany('''
+            INSERT INTO user_attempts (user, challenge_id, attempts, failures, last_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (user, challenge_id) DO UPDATE SET
+                attempts = attempts + excluded.attempts,
+                failures = failures + excluded.failures,
+                last_at = excluded.last_at
+        ''', [(user, challenge_id, count, failures[(user, challenge_id)], last_at[(user, challenge_id)])
+              for (user, challenge_id), count in attempts.items()])
+
+        per_challenge: Dict[str, List[int]] = {}
+        for (user, challenge_id), count in attempts.items():
+            totals = per_challenge.setdefault(challenge_id, [0, 0])
+            totals[0] += count
+            totals[1] += failures[(user, challenge_id)]
+        cursor.executemany('''
+            INSERT INTO challenge_stats (challenge_id, attempts, failures) VALUES (?, ?, ?)
+            ON CONFLICT (challenge_id) DO UPDATE SET
+                attempts = attempts + excluded.attempts,
+                failures = failures + excluded.failures
+        ''', [(challenge_id, totals[0], totals[1]) for challenge_id, totals in per_challenge.items()])
+
+        # Compare timestamps rather than flush order, since each worker flushes on its own schedule
+        cursor.executemany('''
+            UPDATE challenge_stats SET
+                solves = solves + 1,
+                first_blood_user = CASE WHEN first_blood_at IS NULL OR :at < first_blood_at
+                                        THEN :user ELSE first_blood_user END,
+                first_blood_at = MIN(COALESCE(first_blood_at, :at), :at)
+            WHERE challenge_id = :challenge_id
+        ''', [{'user': user, 'at': solved_at, 'challenge_id': challenge_id}
+              for user, challenge_id, solved_at in first_solves])
+        cursor.executemany('''
+            INSERT INTO solve_curve (challenge_id, bucket, solves) VALUES (?, ?, 1)
+            ON CONFLICT (challenge_id, bucket) DO UPDATE SET solves = solves + 1
+        ''', [(challenge_id, int(solved_at // CURVE_BUCKET_SECONDS) * CURVE_BUCKET_SECONDS)
+              for _, challenge_id, solved_at in first_solves])
+
+    def flush(self) -> int:
+        """Write everything buffered so far and return how many submissions that was"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self._take()
+                if not batch:
+                    return written
+                try:
+                    self._write(batch)
+                except sqlite3.IntegrityError as e:
+                    # Retrying would fail forever; save the good rows one by one and drop the rest
+                    print(f"Error flushing submissions, writing the batch row by row: {e}")
+                    try:
+                        kept = self._write_each(batch)
+                    except sqlite3.Error as e:
+                        print(f"Error flushing submissions: {e}")
+                        return written
+                    written += kept
+                    self.flushed += kept
+                    continue
+                except sqlite3.Error as e:
+                    # Put the batch back so the next flush retries it
+                    self._buffer.extendleft(reversed(batch))
+                    print(f"Error flushing submissions: {e}")
+                    return written
+                written += len(batch)
+                self.flushed += len(batch)
+
+    def _write_each(self, batch: List[Submission]) -> int:
+        """Write a batch one submission at a time, dropping those the database rejects"""
+        kept = 0
+        for i, submission in enumerate(batch):
+            try:
+                self._write([submission])
+                kept += 1
+            except sqlite3.IntegrityError as e:
+                self.rejected += 1
+                print(f"Dropped invalid submission {submission}: {e}")
+            except sqlite3.Error:
+                # Not this row's fault: put back what is left for the next flush
+                self._buffer.extendleft(reversed(batch[i:]))
+                self.flushed += kept
+                raise
+        return kept
+
+    def _run(self) -> None:
+        """Flush whenever a batch fills up or the interval passes"""
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def start(self) -> None:
+        """Start the flusher in this process and flush what is left at exit; safe after fork"""
+        if self._pid == os.getpid():
+            return
+        with self._flush_lock:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(target=self._run, daemon=True).start()
+            atexit.register(self.flush)
+            self._pid = os.getpid()
+
+def _rows(db_path: str, query: str, params: Tuple = ()) -> List[Dict[str, Any]]:
+    """Run a read-only analytics query"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    rows = [dict(row) for row in conn.execute(query, params).fetchall()]
+    conn.close()
+    return rows
+
+def challenge_stats(db_path: str = 'ctf_submissions.db') -> List[Dict[str, Any]]:
+    """Attempts, solves and first blood per challenge, most solved first"""
+    return _rows(db_path, 'SELECT * FROM challenge_stats ORDER BY solves DESC, attempts DESC')
+
+def solve_curve(challenge_id: str, db_path: str = 'ctf_submissions.db') -> List[Dict[str, Any]]:
+    """Cumulative solves over time for one challenge"""
+    total = 0
+    curve = []
+    for row in _rows(db_path, 'SELECT bucket, solves FROM solve_curve WHERE challenge_id = ? ORDER BY bucket',
+                     (challenge_id,)):
+        total += row['solves']
+        curve.append({'time': row['bucket'], 'solves': row['solves'], 'total': total})
+    return curve
+
+def suspected_bruteforce(min_failures: int = 50, db_path: str = 'ctf_submissions.db') -> List[Dict[str, Any]]:
+    """Users with many wrong answers on a single challenge"""
+    return _rows(db_path, '''
+        SELECT user, challenge_id, attempts, failures, last_at FROM user_attempts
+        WHERE failures >= ? ORDER BY failures DESC
+    ''', (min_failures,))
+
+# Print analytics from the command line
+def main():
+    parser = argparse.ArgumentParser(description="Flag submission analytics")
+    parser.add_argument('--db', default='ctf_submissions.db', help="Submission log database")
+    parser.add_argument('--curve', metavar='CHALLENGE_ID', help="Print the solve curve of one challenge")
+    parser.add_argument('--min-failures', type=int, default=50, help="Threshold for brute-force suspects")
+    args = parser.parse_args()
+
+    if args.curve:
+        for point in solve_curve(args.curve, args.db):
+            print(f"{time.strftime('%Y-%m-%d %H:%M', time.gmtime(point['time']))}  +{point['solves']}  {point['total']}")
+        return
+
+    print(f"{'Challenge':<40} {'Attempts':>8} {'Solves':>6}  First blood")
+    for row in challenge_stats(args.db):
+        first_blood = row['first_blood_user'] or '-'
+        print(f"{row['challenge_id']:<40} {row['attempts']:>8} {row['solves']:>6}  {first_blood}")
+    suspects = suspected_bruteforce(args.min_failures, args.db)
+    if suspects:
+        print("\nPossible brute forcing:")
+        for row in suspects:
+            print(f"  {row['user']} on {row['challenge_id']}: {row['failures']} wrong of {row['attempts']}")
+
+if __name__ == '__main__':
+    main()
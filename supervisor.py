@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import fcntl
+import signal
+import socket
+import atexit
+import sqlite3
+import argparse
+import threading
+import subprocess
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+import layout
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Instances bind every interface, so free ports are probed on the same address
+BIND_HOST = "0.0.0.0"
+# Instances are player-facing: they get only these variables, never the platform's secrets
+CHILD_ENV = ("PATH", "HOME", "LANG", "LC_ALL", "TZ", "TMPDIR", "PYTHONPATH", "PYTHONHOME", "VIRTUAL_ENV")
+LOCK_SUFFIX = ".lock"
+
+#class for one running copy of a generated web challenge
+class Instance:
+    def __init__(self, challenge_id: str, port: int, pid: int, process: Optional[subprocess.Popen] = None,
+                 owner: Optional[str] = None, started_at: Optional[float] = None,
+                 claimed_at: Optional[float] = None):
+        self.challenge_id = challenge_id
+        self.port = port
+        self.pid = pid
+        # Only the worker that started an instance holds its process handle
+        self.process = process
+        self.owner = owner
+        self.started_at = started_at or time.time()
+        self.claimed_at = claimed_at
+
+    def alive(self) -> bool:
+        """Check whether the process is still running"""
+        if self.process is not None:
+            return self.process.poll() is None
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                # An exited child of another worker lingers as a zombie until that worker reaps it
+                return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+        except OSError:
+            pass
+        try:
+            os.kill(self.pid, 0)
+            return True
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+
+    def rss_mb(self) -> Optional[float]:
+        """Resident memory of the process in MB, read from /proc when available"""
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        return None
+
+    def responding(self, host: str = "127.0.0.1", timeout: float = 0.5) -> bool:
+        """Check whether the instance accepts TCP connections"""
+        try:
+            with socket.create_connection((host, self.port), timeout=timeout):
+                return True
+        except OSError:
+            return False
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Terminate the process, killing it if it does not exit within timeout"""
+        if not self.alive():
+            return
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            return
+        try:
+            os.kill(self.pid, signal.SIGTERM)
+            deadline = time.time() + timeout
+            while self.alive() and time.time() < deadline:
+                time.sleep(0.1)
+            if self.alive():
+                os.kill(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+#class that launches, pools and reaps generated web challenge apps, shared by every worker on a host
+class InstanceSupervisor:
+    def __init__(self, challenges_dir: str = "challenges", host: str = "127.0.0.1",
+                 port_range: Tuple[int, int] = (20000, 21000), warm_per_challenge: int = 1,
+                 lifetime: int = 3600, memory_limit_mb: int = 128, max_instances: int = 100,
+                 startup_timeout: float = 10.0, state_db: str = "ctf_instances.db"):
+        self.challenges_dir = Path(challenges_dir)
+        self.host = host
+        self.port_range = port_range
+        self.warm_per_challenge = warm_per_challenge
+        # Players reach instances directly, so their traffic is never seen here: a claimed
+        # instance is stopped this many seconds after the player last opened it
+        self.lifetime = lifetime
+        self.memory_limit_mb = memory_limit_mb
+        self.max_instances = max_instances
+        self.startup_timeout = startup_timeout
+        # Every worker records its instances here, so all of them see and reuse the same ones
+        self.state_db = state_db
+        # Instances started by this process, whose exit only this process can collect
+        self.instances: List[Instance] = []
+        self.warm_challenges = set()
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._init_db()
+
+    def _init_db(self) -> None:
+        """Create the instance registry if it does not exist"""
+        conn = sqlite3.connect(self.state_db)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS instances (
+                port INTEGER PRIMARY KEY,
+                challenge_id TEXT NOT NULL,
+                pid INTEGER NOT NULL,
+                owner TEXT,
+                started_at REAL NOT NULL,
+                claimed_at REAL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the registry with writes serialized across workers"""
+        conn = sqlite3.connect(self.state_db, timeout=30, isolation_level=None)
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def _registered(self, cursor: sqlite3.Cursor, where: str = "", params: Tuple = ()) -> List[Instance]:
+        """Instances in the registry, with process handles for the ones this process started"""
+        own = {instance.pid: instance.process for instance in self.instances}
+        cursor.execute(f"SELECT challenge_id, port, pid, owner, started_at, claimed_at FROM instances {where}", params)
+        return [Instance(challenge_id, port, pid, own.get(pid), owner, started_at, claimed_at)
+                for challenge_id, port, pid, owner, started_at, claimed_at in cursor.fetchall()]
+
+    def challenge_app(self, challenge_id: str) -> Optional[Path]:
+        """Return the app.py of a generated web challenge that can run as an instance, or None"""
+        challenge_dir = layout.resolve(self.challenges_dir, challenge_id)
+        app_path = challenge_dir / "app.py" if challenge_dir else None
+        if not app_path or not app_path.is_file():
+            return None
+        # Apps generated before instances existed listen on a fixed port, so every copy would collide
+        return app_path if "PORT" in app_path.read_text(errors="replace") else None
+
+    def _allocate_port(self, cursor: sqlite3.Cursor) -> int:
+        """Find a free port in the configured range"""
+        used = {port for port, in cursor.execute("SELECT port FROM instances")}
+        for port in range(*self.port_range):
+            if port in used:
+                continue
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.bind((BIND_HOST, port))
+                except OSError:
+                    continue
+            return port
+        raise RuntimeError("No free ports left for challenge instances")
+
+    def _limit_memory(self, pid: int) -> None:
+        """Cap the address space of a child as a hard backstop to the RSS check in reap()"""
+        # Virtual size runs well above RSS for a Python process, hence the headroom
+        limit = self.memory_limit_mb * 4 * 1024 * 1024
+        try:
+            resource.prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+        except OSError as e:
+            print(f"Error limiting memory of instance {pid}: {e}")
+
+    def _spawn(self, cursor: sqlite3.Cursor, challenge_id: str, owner: Optional[str] = None) -> Instance:
+        """Start one instance of a challenge on a fresh port and register it"""
+        app_path = self.challenge_app(challenge_id)
+        if app_path is None:
+            raise ValueError(f"{challenge_id} is not a web challenge")
+        count, = cursor.execute("SELECT COUNT(*) FROM instances").fetchone()
+        if count >= self.max_instances:
+            raise RuntimeError("Instance limit reached")
+
+        port = self._allocate_port(cursor)
+        env = {name: os.environ[name] for name in CHILD_ENV if name in os.environ}
+        env["PORT"] = str(port)
+        # A session of its own keeps terminal signals sent to the web app away from instances
+        process = subprocess.Popen(
+            [sys.executable, app_path.name],
+            cwd=str(app_path.parent),
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        if hasattr(resource, "prlimit"):
+            self._limit_memory(process.pid)
+        now = time.time()
+        instance = Instance(challenge_id, port, process.pid, process, owner, now, now if owner else None)
+        cursor.execute("INSERT INTO instances (port, challenge_id, pid, owner, started_at, claimed_at) "
+                       "VALUES (?, ?, ?, ?, ?, ?)",
+                       (port, challenge_id, instance.pid, owner, instance.started_at, instance.claimed_at))
+        with self._lock:
+            self.instances.append(instance)
+        return instance
+
+    def _wait_ready(self, instance: Instance) -> bool:
+        """Wait until an instance accepts connections or dies"""
+        deadline = time.time() + self.startup_timeout
+        while time.time() < deadline:
+            if not instance.alive():
+                return False
+            if instance.responding(self.host):
+                return True
+            time.sleep(0.1)
+        return False
+
+    def _forget(self, instances: List[Instance]) -> None:
+        """Drop instances from the registry; callers stop them afterwards, outside any lock"""
+        if not instances:
+            return
+        conn = self._connect()
+        conn.executemany("DELETE FROM instances WHERE port = ? AND pid = ?",
+                         [(instance.port, instance.pid) for instance in instances])
+        conn.execute("COMMIT")
+        conn.close()
+
+    def _stop_instances(self, instances: List[Instance]) -> None:
+        """Stop instances that are no longer registered"""
+        for instance in instances:
+            instance.stop()
+        self._collect()
+
+    def _collect(self) -> None:
+        """Wait for exited children of this process so they do not linger as zombies"""
+        with self._lock:
+            self.instances = [instance for instance in self.instances if instance.alive()]
+
+    def warm(self, challenge_id: str) -> None:
+        """Keep pre-started, unclaimed instances of a challenge ready"""
+        self.warm_challenges.add(challenge_id)
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            idle = [i for i in self._registered(cursor, "WHERE challenge_id = ? AND owner IS NULL", (challenge_id,))
+                    if i.alive()]
+            for _ in range(self.warm_per_challenge - len(idle)):
+                self._spawn(cursor, challenge_id)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def claim(self, challenge_id: str, owner: str) -> Instance:
+        """Hand a player their instance of a challenge, reusing a warm one if possible"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            candidates = self._registered(cursor, "WHERE challenge_id = ? AND (owner = ? OR owner IS NULL) "
+                                                  "ORDER BY owner IS NULL", (challenge_id, owner))
+            instance = next((i for i in candidates if i.alive()), None)
+            if instance is None:
+                instance = self._spawn(cursor, challenge_id, owner)
+            else:
+                cursor.execute("UPDATE instances SET owner = ?, claimed_at = ? WHERE port = ?",
+                               (owner, now, instance.port))
+                instance.owner = owner
+                instance.claimed_at = now
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        if not self._wait_ready(instance):
+            self._forget([instance])
+            self._stop_instances([instance])
+            raise RuntimeError(f"Instance of {challenge_id} failed to start")
+
+        # Top the pool back up off the request path
+        threading.Thread(target=self._safe_warm, args=(challenge_id,), daemon=True).start()
+        return instance
+
+    def _safe_warm(self, challenge_id: str) -> None:
+        """warm() for background threads, where errors can only be reported"""
+        try:
+            self.warm(challenge_id)
+        except (OSError, RuntimeError, ValueError, sqlite3.Error) as e:
+            print(f"Error warming {challenge_id}: {e}")
+
+    def reap(self) -> List[Instance]:
+        """Stop dead, expired or over-memory instances and return them"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            victims = []
+            for instance in self._registered(conn.cursor()):
+                rss = instance.rss_mb()
+                expired = instance.claimed_at is not None and now - instance.claimed_at > self.lifetime
+                over_memory = rss is not None and rss > self.memory_limit_mb
+                if not instance.alive() or expired or over_memory:
+                    victims.append(instance)
+            conn.executemany("DELETE FROM instances WHERE port = ? AND pid = ?",
+                             [(instance.port, instance.pid) for instance in victims])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        # Unregistered first, so stopping them holds up no other worker
+        self._stop_instances(victims)
+        return victims
+
+    def health(self) -> List[Dict[str, Any]]:
+        """Report the state of every instance"""
+        now = time.time()
+        conn = sqlite3.connect(self.state_db)
+        instances = self._registered(conn.cursor())
+        conn.close()
+        return [{
+            "challenge_id": instance.challenge_id,
+            "port": instance.port,
+            "pid": instance.pid,
+            "owner": instance.owner,
+            "alive": instance.alive(),
+            "responding": instance.responding(self.host),
+            "rss_mb": instance.rss_mb(),
+            "uptime": int(now - instance.started_at),
+            "claimed": int(now - instance.claimed_at) if instance.claimed_at is not None else None,
+        } for instance in instances]
+
+    def _run(self, interval: float) -> None:
+        """Background loop: collect exited children; the process holding the lock file also reaps and warms"""
+        lock_file = open(self.state_db + LOCK_SUFFIX, "w")
+        leader = False
+        while not self._stop.wait(interval):
+            self._collect()
+            if not leader:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    leader = True
+                except BlockingIOError:
+                    # Another worker reaps; take over if it goes away
+                    continue
+            try:
+                self.reap()
+                conn = sqlite3.connect(self.state_db)
+                registered = {challenge_id for challenge_id, in conn.execute("SELECT DISTINCT challenge_id FROM instances")}
+                conn.close()
+            except sqlite3.Error as e:
+                print(f"Error reaping instances: {e}")
+                continue
+            for challenge_id in self.warm_challenges | registered:
+                self._safe_warm(challenge_id)
+        lock_file.close()
+
+    def start(self, interval: float = 30.0) -> None:
+        """Start the background loop in this process; safe to call on every request and after fork"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Forked from the process that started these; their handles are not ours
+                self.instances = []
+            self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+            atexit.register(self.shutdown)
+
+    def shutdown(self) -> None:
+        """Stop the background loop and every instance this process started"""
+        self._stop.set()
+        with self._lock:
+            instances = list(self.instances)
+        self._forget(instances)
+        self._stop_instances(instances)
+
+# Run a standalone supervisor that keeps the given challenges warm
+def main():
+    parser = argparse.ArgumentParser(description="Supervise generated web challenge instances")
+    parser.add_argument('challenges', nargs='+', help="Challenge ids to keep warm")
+    parser.add_argument('--dir', default='challenges', help="Generated challenges directory")
+    parser.add_argument('--warm', type=int, default=2, help="Warm instances per challenge")
+    parser.add_argument('--memory', type=int, default=128, help="Memory cap per instance in MB")
+    parser.add_argument('--lifetime', type=int, default=3600, help="Seconds a claimed instance runs after its last claim")
+    parser.add_argument('--state-db', default='ctf_instances.db', help="Instance registry shared with the web app")
+    parser.add_argument('--interval', type=float, default=30.0, help="Seconds between health reports")
+    args = parser.parse_args()
+
+    supervisor = InstanceSupervisor(args.dir, warm_per_challenge=args.warm, lifetime=args.lifetime,
+                                    memory_limit_mb=args.memory, state_db=args.state_db)
+    for challenge_id in args.challenges:
+        supervisor.warm(challenge_id)
+    supervisor.start(args.interval)
+    try:
+        while True:
+            for status in supervisor.health():
+                print(f"{status['challenge_id']} :{status['port']} pid={status['pid']} "
+                      f"alive={status['alive']} responding={status['responding']} rss={status['rss_mb']}")
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        supervisor.shutdown()
+
+if __name__ == '__main__':
+    main()
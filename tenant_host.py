@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import threading
+import importlib.util
+from pathlib import Path
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Callable, Iterable, Tuple
+
+import layout
+
+#class for one generated challenge app loaded into this process
+class Tenant:
+    def __init__(self, challenge_id: str, directory: Path, module_name: str, app: Callable):
+        self.challenge_id = challenge_id
+        self.directory = directory
+        self.module_name = module_name
+        self.app = app
+        self.last_used = time.time()
+
+#WSGI app that serves many generated web challenges from one process
+class TenantHost:
+    def __init__(self, challenges_dir: str = "challenges", prefix: str = "/c",
+                 host_suffix: Optional[str] = None, max_tenants: int = 200, idle_timeout: int = 1800):
+        self.challenges_dir = Path(challenges_dir).resolve()
+        self.prefix = prefix.rstrip("/")
+        self.host_suffix = host_suffix
+        self.max_tenants = max_tenants
+        self.idle_timeout = idle_timeout
+        self.tenants: "OrderedDict[str, Tenant]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Generated apps open files relative to the working directory, which is process-wide,
+        # so requests are serialized around chdir. Use sync/process workers, not threads.
+        self._cwd_lock = threading.Lock()
+
+    def _route(self, environ: Dict[str, Any]) -> Tuple[Optional[str], str, str]:
+        """Work out (challenge_id, script_name, path_info) from the Host header or the path"""
+        path = environ.get("PATH_INFO", "")
+        if self.host_suffix:
+            host = environ.get("HTTP_HOST", "").split(":")[0]
+            if host.endswith(self.host_suffix):
+                return host[:-len(self.host_suffix)].rstrip("."), environ.get("SCRIPT_NAME", ""), path
+
+        if not path.startswith(self.prefix + "/"):
+            return None, "", path
+        challenge_id, slash, rest = path[len(self.prefix) + 1:].partition("/")
+        script_name = environ.get("SCRIPT_NAME", "") + f"{self.prefix}/{challenge_id}"
+        return challenge_id, script_name, slash + rest
+
+    def _load(self, challenge_id: str) -> Optional[Tenant]:
+        """Import a challenge's app.py under a private module name"""
+        directory = layout.resolve(self.challenges_dir, challenge_id)
+        if directory is None:
+            return None
+        app_path = directory / "app.py"
+        if not app_path.is_file():
+            return None
+
+        module_name = f"ctf_tenant_{challenge_id}"
+        spec = importlib.util.spec_from_file_location(module_name, app_path)
+        module = importlib.util.module_from_spec(spec)
+        # Flask looks the module up in sys.modules to find its root path
+        sys.modules[module_name] = module
+        with self._cwd_lock:
+            previous = os.getcwd()
+            os.chdir(directory)
+            try:
+                spec.loader.exec_module(module)
+            except Exception:
+                sys.modules.pop(module_name, None)
+                raise
+            finally:
+                os.chdir(previous)
+        return Tenant(challenge_id, directory, module_name, module.app)
+
+    def _evict(self, tenant: Tenant) -> None:
+        """Drop a tenant so its module can be garbage collected"""
+        self.tenants.pop(tenant.challenge_id, None)
+        sys.modules.pop(tenant.module_name, None)
+
+    def get_tenant(self, challenge_id: str) -> Optional[Tenant]:
+        """Return a loaded tenant, loading it on first hit and evicting LRU/idle ones"""
+        with self._lock:
+            tenant = self.tenants.get(challenge_id)
+            if tenant is None:
+                tenant = self._load(challenge_id)
+                if tenant is None:
+                    return None
+                self.tenants[challenge_id] = tenant
+            self.tenants.move_to_end(challenge_id)
+            tenant.last_used = time.time()
+
+            while len(self.tenants) > self.max_tenants:
+                self._evict(next(iter(self.tenants.values())))
+            return tenant
+
+    def evict_idle(self) -> int:
+        """Unload tenants that have not been hit within idle_timeout"""
+        cutoff = time.time() - self.idle_timeout
+        with self._lock:
+            idle = [t for t in self.tenants.values() if t.last_used < cutoff]
+            for tenant in idle:
+                self._evict(tenant)
+        return len(idle)
+
+    def __call__(self, environ: Dict[str, Any], start_response: Callable) -> Iterable[bytes]:
+        challenge_id, script_name, path_info = self._route(environ)
+        try:
+            tenant = self.get_tenant(challenge_id) if challenge_id else None
+        except Exception as e:
+            start_response("500 Internal Server Error", [("Content-Type", "text/plain")])
+            return [f"Error loading challenge: {e}".encode()]
+        if tenant is None:
+            start_response("404 Not Found", [("Content-Type", "text/plain")])
+            return [b"Challenge not found"]
+
+        if not path_info:
+            # Generated apps use relative links, which need the trailing slash
+            start_response("308 Permanent Redirect", [("Location", script_name + "/")])
+            return [b""]
+
+        environ = dict(environ, SCRIPT_NAME=script_name, PATH_INFO=path_info)
+        with self._cwd_lock:
+            previous = os.getcwd()
+            os.chdir(tenant.directory)
+            try:
+                response = tenant.app(environ, start_response)
+                try:
+                    # Drain inside the working directory so lazy bodies resolve paths too
+                    body = list(response)
+                finally:
+                    if hasattr(response, "close"):
+                        response.close()
+            finally:
+                os.chdir(previous)
+        return body
+
+    def start_reaper(self, interval: float = 60.0) -> None:
+        """Evict idle tenants periodically in a daemon thread"""
+        def run():
+            while True:
+                time.sleep(interval)
+                self.evict_idle()
+        threading.Thread(target=run, daemon=True).start()
+
+# Entry point for gunicorn: gunicorn -w 4 tenant_host:application
+application = TenantHost(
+    os.environ.get("CTF_CHALLENGES_DIR", "challenges"),
+    prefix=os.environ.get("CTF_TENANT_PREFIX", "/c"),
+    host_suffix=os.environ.get("CTF_TENANT_HOST_SUFFIX"),
+    max_tenants=int(os.environ.get("CTF_MAX_TENANTS", 200)),
+    idle_timeout=int(os.environ.get("CTF_TENANT_IDLE_TIMEOUT", 1800)),
+)
+application.start_reaper()
+
+if __name__ == '__main__':
+    from werkzeug.serving import run_simple
+    run_simple("0.0.0.0", int(os.environ.get("PORT", 8000)), application)
@@ -0,0 +1,100 @@
+import os
+import sys
+import sqlite3
+import importlib
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+@pytest.fixture(scope="module")
+def webapp(tmp_path_factory):
+    # Importing webapp creates databases and directories, so point all of them at a scratch dir
+    scratch = tmp_path_factory.mktemp("platform")
+    os.makedirs(scratch / "challenges")
+    env = {
+        "CTF_SECRET_KEY": "test",
+        "CTF_CHALLENGES_DIR": str(scratch / "challenges"),
+        "CTF_INSTANCES_DB": str(scratch / "instances.db"),
+        "CTF_POOL_DIR": str(scratch / "challenge_pool"),
+        "CTF_POOL_DEPTH": "0",
+        "CTF_BUS_DB": str(scratch / "bus.db"),
+        "CTF_SUBMISSIONS_DB": str(scratch / "submissions.db"),
+        "CTF_SUBMISSIONS_LOG": str(scratch / "submissions.log"),
+        "CTF_PREVIEW_DIR": str(scratch / "preview_cache"),
+    }
+    saved = {key: os.environ.get(key) for key in env}
+    cwd = os.getcwd()
+    os.environ.update(env)
+    os.chdir(scratch)
+    try:
+        yield importlib.import_module("webapp")
+    finally:
+        os.chdir(cwd)
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+@pytest.fixture
+def platform(webapp, tmp_path, monkeypatch):
+    # The platform database path is relative to the cwd, so each test gets its own
+    monkeypatch.chdir(tmp_path)
+    webapp.catalog.init_platform()
+    return webapp
+
+def _add(webapp, title, category, author):
+    return webapp.save_custom_challenge(title, "desc", category, "CTF{x}", author, [])
+
+def _statuses(*challenge_ids):
+    conn = sqlite3.connect("ctf_platform.db")
+    rows = dict(conn.execute(f"SELECT id, status FROM custom_challenges WHERE id IN ({', '.join('?' for _ in challenge_ids)})",
+                             challenge_ids).fetchall())
+    conn.close()
+    return [rows[cid] for cid in challenge_ids]
+
+def test_bulk_update_explicit_ids(platform):
+    first = _add(platform, "one", "crypto", "alice")
+    second = _add(platform, "two", "web", "bob")
+    untouched = _add(platform, "three", "web", "bob")
+
+    results = platform.bulk_update_challenge_status([first, second, "missing"], "approved", "admin")
+
+    assert results == {first: "approved", second: "approved", "missing": "not_found"}
+    assert _statuses(first, second, untouched) == ["approved", "approved", "pending"]
+    assert platform.catalog.get_challenge(first)["status"] == "approved"
+
+def test_bulk_update_ids_outside_filter_are_reported(platform):
+    crypto = _add(platform, "one", "crypto", "alice")
+    web = _add(platform, "two", "web", "alice")
+    other_author = _add(platform, "three", "crypto", "bob")
+
+    results = platform.bulk_update_challenge_status([crypto, web, other_author], "rejected", "admin",
+                                                    category="crypto", author="alice")
+
+    assert results == {crypto: "rejected", web: "filtered_out", other_author: "filtered_out"}
+    assert _statuses(crypto, web, other_author) == ["rejected", "pending", "pending"]
+
+def test_bulk_update_by_filter_only_touches_pending(platform):
+    pending = _add(platform, "one", "crypto", "alice")
+    reviewed = _add(platform, "two", "crypto", "alice")
+    platform.update_challenge_status(reviewed, "rejected", "admin")
+    other = _add(platform, "three", "web", "alice")
+
+    results = platform.bulk_update_challenge_status([], "approved", "admin", category="crypto")
+
+    assert results == {pending: "approved"}
+    assert _statuses(pending, reviewed, other) == ["approved", "rejected", "pending"]
+
+def test_review_bulk_reports_malformed_ids_like_other_errors(platform):
+    platform.set_user_role("admin", "admin")
+    client = platform.app.test_client()
+    with client.session_transaction() as s:
+        s["user"] = "admin"
+
+    response = client.post("/review_bulk", json={"challenge_ids": "not-a-list", "action": "approve"})
+
+    assert response.status_code == 200
+    assert response.get_json()["success"] is False
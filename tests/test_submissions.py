@@ -0,0 +1,30 @@
+import sys
+import sqlite3
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from submissions import SubmissionLog
+
+def _count(db_path, table):
+    conn = sqlite3.connect(db_path)
+    count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    conn.close()
+    return count
+
+def test_invalid_submission_is_dropped_not_retried(tmp_path):
+    db_path = str(tmp_path / "submissions.db")
+    log = SubmissionLog(db_path)
+    log.record("alice", "challenge_1", "generated", False)
+    log.record("alice", None, "generated", False)
+    log.record("alice", "challenge_1", "generated", True)
+
+    assert log.flush() == 2
+    assert log.pending == 0
+    assert log.rejected == 1
+    assert _count(db_path, "submissions") == 2
+
+    # The failed batch must not leave the database locked for the next flush
+    log.record("bob", "challenge_1", "generated", True)
+    assert log.flush() == 1
+    assert _count(db_path, "solves") == 2
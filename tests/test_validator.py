@@ -0,0 +1,27 @@
+import sys
+import random
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import layered
+import validator
+
+# Seeds whose artifacts were once rejected: a zeroed filler block under XOR passed for base64
+REGRESSION_SEEDS = [19, 22, 78, 86, 121, 123, 140, 160, 201, 255, 296]
+
+@pytest.mark.parametrize("seed", sorted(set(range(20)) | set(REGRESSION_SEEDS)))
+def test_solve_layered_recovers_flag(tmp_path, seed):
+    rng = random.Random(seed)
+    layers = layered.plan_layers(rng)
+    flag = f"CTF{{seed_{seed}}}"
+    artifact = tmp_path / "evidence.bin"
+    with open(artifact, "wb") as f:
+        layered.write_artifact(f, flag, 64 * 1024, layers, rng)
+    assert validator.solve_layered(artifact) == flag
+
+def test_xor_over_zeroed_block_is_not_base64():
+    head = bytes([0x5a]) * 512
+    assert validator._xor_candidates(head) == []
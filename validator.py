@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import json
+import codecs
+import base64
+import binascii
+import gzip
+import shutil
+import tarfile
+import zipfile
+import argparse
+import tempfile
+import importlib.util
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict, Any, List
+
+from layout import iter_challenge_dirs
+
+FLAG_PATTERN = re.compile(rb"CTF\{[^}\s]{1,128}\}")
+# Layered artifacts are peeled through temporary files, a chunk at a time
+CHUNK_SIZE = 1024 * 1024
+MAX_LAYERS = 16
+CONTAINER_LAYERS = ("gzip", "zip", "tar")
+BASE64_BYTES = set(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=\r\n")
+COMMON_PASSWORDS = ["admin", "password", "password123", "123456", "letmein", "qwerty", "root", "toor"]
+
+class SolveError(Exception):
+    """Raised when a solver cannot recover a flag, with the reason as message"""
+
+class NoSolver(SolveError):
+    """Raised for challenge types no automated solver can check; they are skipped, not failed"""
+
+def _read_heading(challenge_dir: Path) -> str:
+    """Return the subtype from a generated README heading, e.g. 'Base64'"""
+    readme = challenge_dir / "README.md"
+    if not readme.exists():
+        return ""
+    first_line = readme.read_text(errors="replace").splitlines()[0] if readme.stat().st_size else ""
+    return first_line.split(":", 1)[1].strip() if ":" in first_line else ""
+
+def _search_flag(data: bytes) -> str:
+    """Find the first flag-shaped token in raw bytes"""
+    match = FLAG_PATTERN.search(data)
+    if not match:
+        raise SolveError("no flag found in data")
+    return match.group().decode()
+
+def vigenere_decrypt(ciphertext: str, key: str) -> str:
+    """Inverse of the generator's case-preserving Vigenère shift"""
+    return "".join(
+        chr((ord(c) - (65 if c.isupper() else 97) - ord(key[i % len(key)])) % 26 + (65 if c.isupper() else 97))
+        if c.isalpha() else c
+        for i, c in enumerate(ciphertext)
+    )
+
+def solve_crypto(challenge_dir: Path) -> str:
+    """Decode challenge.txt according to the subtype named in README.md"""
+    text = (challenge_dir / "challenge.txt").read_text()
+    encrypted_flag = text.split("Decrypt this: ", 1)[-1].rstrip("\n")
+    subtype = _read_heading(challenge_dir)
+
+    if subtype == "Base64":
+        return base64.b64decode(encrypted_flag).decode()
+    if subtype == "Rot13":
+        return codecs.decode(encrypted_flag, "rot13")
+    if subtype == "Vigenere":
+        match = re.search(r"Key: (\w+)", (challenge_dir / "README.md").read_text())
+        if not match:
+            raise SolveError("Vigenère key missing from README")
+        return vigenere_decrypt(encrypted_flag, match.group(1))
+    if subtype == "Xor":
+        for key in range(1, 256):
+            candidate = "".join(chr(ord(c) ^ key) for c in encrypted_flag)
+            if candidate.startswith("CTF{"):
+                return candidate
+        raise SolveError("no single-byte XOR key yields a flag")
+    if subtype == "Aes":
+        from cryptography.fernet import Fernet
+        key = (challenge_dir / "key.txt").read_text().strip()
+        return Fernet(key.encode()).decrypt(encrypted_flag.encode()).decode()
+    if subtype == "Rsa Simplified":
+        return bytes.fromhex(encrypted_flag).decode()
+    raise SolveError(f"unknown crypto subtype '{subtype}'")
+
+def _identify_layer(head: bytes) -> Optional[str]:
+    """Name the container or encoding a blob starts with, if any"""
+    if head[:2] == b"\x1f\x8b":
+        return "gzip"
+    if head[:4] == b"PK\x03\x04":
+        return "zip"
+    if head[257:262] == b"ustar":
+        return "tar"
+    if len(head) >= 16 and set(head) <= BASE64_BYTES:
+        return "base64"
+    return None
+
+def _xor_bytes(data: bytes, key: int) -> bytes:
+    """XOR every byte with a single-byte key"""
+    return (int.from_bytes(data, "big") ^ int.from_bytes(bytes([key]) * len(data), "big")).to_bytes(len(data), "big")
+
+def _scan_file(path: Path) -> Optional["re.Match[bytes]"]:
+    """Search a file for a flag in chunks, overlapping so flags across chunk edges are found"""
+    overlap = b""
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            window = overlap + chunk
+            match = FLAG_PATTERN.search(window)
+            if match:
+                return match
+            overlap = window[-256:]
+    return None
+
+def _find_xored_flag(path: Path) -> Optional[str]:
+    """Find a flag under an unknown single-byte XOR key in one pass
+
+    XORing each byte with its neighbour cancels the key, so the flag prefix can be
+    searched for once instead of once per key.
+    """
+    prefix = bytes(a ^ b for a, b in zip(b"CTF{", b"TF{"))
+    overlap = b""
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            window = overlap + chunk
+            neighbours = (int.from_bytes(window[:-1], "big") ^ int.from_bytes(window[1:], "big")).to_bytes(len(window) - 1, "big")
+            position = neighbours.find(prefix)
+            while position != -1:
+                key = window[position] ^ ord("C")
+                match = FLAG_PATTERN.match(_xor_bytes(window[position:position + 256], key))
+                if match:
+                    return match.group().decode()
+                position = neighbours.find(prefix, position + 1)
+            overlap = window[-256:]
+    return None
+
+def _unwrap(kind: str, path: Path, workdir: str, key: int = 0) -> List[Path]:
+    """Write the contents of one layer to temporary files and return them"""
+    def target() -> Path:
+        return Path(tempfile.mkstemp(dir=workdir)[1])
+
+    outputs = []
+    if kind == "gzip":
+        outputs.append(target())
+        with gzip.open(path, "rb") as src, open(outputs[-1], "wb") as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    elif kind == "zip":
+        with zipfile.ZipFile(path) as archive:
+            for name in archive.namelist():
+                outputs.append(target())
+                with archive.open(name) as src, open(outputs[-1], "wb") as dst:
+                    shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    elif kind == "tar":
+        with tarfile.open(path) as archive:
+            for member in archive:
+                if member.isfile():
+                    outputs.append(target())
+                    with archive.extractfile(member) as src, open(outputs[-1], "wb") as dst:
+                        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    elif kind == "base64":
+        outputs.append(target())
+        pending = b""
+        with open(path, "rb") as src, open(outputs[-1], "wb") as dst:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                pending += chunk.replace(b"\n", b"").replace(b"\r", b"")
+                cut = len(pending) - len(pending) % 4
+                dst.write(base64.b64decode(pending[:cut]))
+                pending = pending[cut:]
+            dst.write(base64.b64decode(pending))
+    elif kind == "xor":
+        outputs.append(target())
+        with open(path, "rb") as src, open(outputs[-1], "wb") as dst:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                dst.write(_xor_bytes(chunk, key))
+    return outputs
+
+def _xor_candidates(head: bytes) -> List[int]:
+    """Single-byte keys under which the head becomes a container or MIME base64
+
+    Only structure a key cannot fake is trusted: container magic, or the newline that
+    ends every 76-character base64 line. An alphabet check alone is fooled by a zeroed
+    block, which any key turns into one repeated byte.
+    """
+    keys = [key for key in range(1, 256)
+            if _identify_layer(_xor_bytes(head[:262], key)) in CONTAINER_LAYERS]
+    if len(head) > 76:
+        key = head[76] ^ ord("\n")
+        decoded = _xor_bytes(head, key)
+        if key and b"\n" not in decoded[:76] and _identify_layer(decoded) == "base64":
+            keys.append(key)
+    return keys
+
+def _peel(path: Path, workdir: str, depth: int = 0) -> Optional[str]:
+    """Recursively unwrap archives, encodings and XOR until a flag turns up"""
+    if depth > MAX_LAYERS:
+        raise SolveError("too many nested layers")
+    with open(path, "rb") as f:
+        head = f.read(512)
+
+    kind = _identify_layer(head)
+    if kind:
+        layers = [(kind, 0)]
+    else:
+        match = _scan_file(path)
+        if match:
+            return match.group().decode()
+        # A single-byte XOR over a known container or encoding shows up in the first bytes
+        layers = [("xor", key) for key in _xor_candidates(head)]
+
+    for kind, key in layers:
+        try:
+            inner = _unwrap(kind, path, workdir, key)
+        except (OSError, EOFError, ValueError, zipfile.BadZipFile, tarfile.TarError, binascii.Error):
+            # The magic bytes were a coincidence
+            continue
+        for inner_path in inner:
+            flag = _peel(inner_path, workdir, depth + 1)
+            if flag:
+                return flag
+
+    # Nothing to unwrap, or unwrapping led nowhere: plain data, maybe XORed as a whole
+    if layers and layers[0][1] == 0:
+        match = _scan_file(path)
+        if match:
+            return match.group().decode()
+    return _find_xored_flag(path)
+
+def solve_layered(artifact: Path) -> str:
+    """Peel a layered-archive artifact without ever loading it into memory"""
+    with tempfile.TemporaryDirectory() as workdir:
+        flag = _peel(artifact, workdir)
+    if not flag:
+        raise SolveError("no layer of the artifact contains a flag")
+    return flag
+
+def solve_forensics(challenge_dir: Path) -> str:
+    """Recover the flag from whichever forensics artifact is present"""
+    if (challenge_dir / "image.jpg").exists():
+        data = (challenge_dir / "image.jpg").read_bytes()
+        end = data.rfind(b"\xff\xd9")
+        return _search_flag(data[end + 2:] if end != -1 else data)
+    if (challenge_dir / "photo.jpg").exists():
+        import piexif
+        exif = piexif.load(str(challenge_dir / "photo.jpg"))
+        return _search_flag(exif.get("Exif", {}).get(piexif.ExifIFD.UserComment, b""))
+    if (challenge_dir / "traffic.pcap").exists():
+        from scapy.all import rdpcap
+        for packet in rdpcap(str(challenge_dir / "traffic.pcap")):
+            # Port 53 payloads get dissected as DNS, so search the whole frame
+            match = FLAG_PATTERN.search(bytes(packet))
+            if match:
+                return match.group().decode()
+        raise SolveError("no packet carries a flag")
+    if (challenge_dir / "evidence.bin").exists():
+        return solve_layered(challenge_dir / "evidence.bin")
+    if (challenge_dir / "data.bin").exists():
+        return _search_flag((challenge_dir / "data.bin").read_bytes())
+    raise SolveError("no known forensics artifact")
+
+def _load_web_app(challenge_dir: Path):
+    """Import a generated app.py and return its Flask app"""
+    module_name = f"ctf_validate_{challenge_dir.name}"
+    spec = importlib.util.spec_from_file_location(module_name, challenge_dir / "app.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module.app
+
+def solve_web(challenge_dir: Path) -> str:
+    """Exploit a generated web app through the Flask test client"""
+    source = (challenge_dir / "app.py").read_text()
+    # Older generated apps open files relative to the working directory
+    previous = os.getcwd()
+    os.chdir(challenge_dir)
+    try:
+        return _exploit_web(_load_web_app(challenge_dir).test_client(), source)
+    finally:
+        os.chdir(previous)
+
+def _exploit_web(client, source: str) -> str:
+    """Pick an exploit from the app source and run it"""
+    if "SELECT * FROM users" in source:
+        return _search_flag(client.get("/", query_string={"input": "' OR '1'='1"}).data)
+    if "os.path.basename(file)" in source:
+        return _search_flag(client.get("/", query_string={"file": "flag.txt"}).data)
+    if "/login" in source:
+        for password in COMMON_PASSWORDS:
+            response = client.post("/login", data={"user": "admin", "password": password})
+            if FLAG_PATTERN.search(response.data):
+                return _search_flag(response.data)
+        raise NoSolver("admin password is not guessable from a wordlist")
+    if "Welcome {user_input}" in source:
+        payload = "<script>alert(1)</script>"
+        if payload.encode() not in client.get("/", query_string={"input": payload}).data:
+            raise SolveError("input is not reflected unescaped")
+        raise NoSolver("XSS is exploitable but the flag is not reachable from the app")
+    raise SolveError("unrecognised web challenge")
+
+def detect_family(challenge_dir: Path) -> str:
+    """Guess the challenge family from the files present"""
+    if (challenge_dir / "app.py").exists():
+        return "web"
+    if (challenge_dir / "challenge.txt").exists():
+        return "crypto"
+    return "forensics"
+
+SOLVERS = {
+    "web": solve_web,
+    "crypto": solve_crypto,
+    "forensics": solve_forensics,
+}
+
+def validate_challenge(challenge_dir: str) -> Dict[str, Any]:
+    """Run the family solver on one challenge and compare against flag.txt"""
+    path = Path(challenge_dir).resolve()
+    family = detect_family(path)
+    result = {"id": path.name, "path": str(path), "family": family, "status": "fail", "detail": ""}
+    try:
+        expected = (path / "flag.txt").read_text().strip()
+        recovered = SOLVERS[family](path)
+        if recovered.strip() == expected:
+            result["status"] = "pass"
+        else:
+            result["detail"] = f"recovered {recovered!r}, expected {expected!r}"
+    except NoSolver as e:
+        result["status"] = "skip"
+        result["detail"] = str(e)
+    except SolveError as e:
+        result["detail"] = str(e)
+    except Exception as e:
+        result["status"] = "error"
+        result["detail"] = f"{type(e).__name__}: {e}"
+    return result
+
+def validate_challenges(challenge_dirs: List[str], workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Validate many challenges in a process pool"""
+    if not challenge_dirs:
+        return []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(validate_challenge, challenge_dirs))
+
+def validate_tree(challenges_dir: str = "challenges", workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Validate every challenge directory under challenges_dir"""
+    dirs = [str(d) for d in iter_challenge_dirs(Path(challenges_dir))]
+    return validate_challenges(dirs, workers)
+
+def discard_failed(results: List[Dict[str, Any]]) -> List[str]:
+    """Delete the directories of challenges that failed; skipped ones are kept"""
+    removed = []
+    for result in results:
+        if result["status"] in ("fail", "error"):
+            shutil.rmtree(result["path"], ignore_errors=True)
+            removed.append(result["id"])
+    return removed
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    """Print a pass/fail line per challenge and a summary"""
+    for result in results:
+        line = f"{result['status'].upper():5} {result['id']} ({result['family']})"
+        print(f"{line}: {result['detail']}" if result["detail"] else line)
+    passed = sum(1 for r in results if r["status"] == "pass")
+    skipped = sum(1 for r in results if r["status"] == "skip")
+    print(f"\n{passed}/{len(results) - skipped} challenges solvable, {skipped} skipped with no solver")
+
+# Parse arguments and validate the tree
+def main():
+    parser = argparse.ArgumentParser(description="Check that generated challenges solve to their flag")
+    parser.add_argument('--dir', default='challenges', help="Generated challenges directory")
+    parser.add_argument('--workers', type=int, default=None, help="Solver processes (default: CPU count)")
+    parser.add_argument('--json', help="Also write the report to this JSON file")
+    parser.add_argument('--discard', action='store_true', help="Delete challenges that fail validation")
+    args = parser.parse_args()
+
+    results = validate_tree(args.dir, args.workers)
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.discard:
+        for challenge_id in discard_failed(results):
+            print(f"Discarded {challenge_id}")
+    if any(r["status"] in ("fail", "error") for r in results) and not args.discard:
+        exit(1)
+
+if __name__ == '__main__':
+    main()
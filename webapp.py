@@ -1,106 +1,171 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, send_file
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, send_file, Response, stream_with_context
 import os
+import gzip
 import json
 import sqlite3
 from pathlib import Path
-from ctforge import ChallengeGenerator, ChallengeType
+from ctforge import ChallengeGenerator, ChallengeType, SUBTYPES
+from supervisor import InstanceSupervisor
+import catalog
+import layout
+from events import bus as event_bus
+from cluster import load_secret_key, InvalidationBus, LocalCache
+from lifecycle import LifecycleManager
+from submissions import SubmissionLog
+from pool import ChallengePool
+from records import GeneratedChallenge, CustomChallenge, ChallengeFile
+import submissions
+import assets
+import previews
+import mimetypes
 import uuid
 from werkzeug.utils import secure_filename
 import datetime
 
 app = Flask(__name__)
-app.secret_key = os.urandom(24)
+# Every worker and node must sign sessions with the same key
+app.secret_key = load_secret_key(Path(__file__).parent)
 app.config['UPLOAD_FOLDER'] = 'custom_challenges'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # allow 16MB max file size
 
+CHALLENGES_DIR = Path(os.environ.get('CTF_CHALLENGES_DIR', str(Path(__file__).parent / 'challenges')))
+
 # Initialize challenge generator
 challenge_gen = ChallengeGenerator()
 
+# Supervisor for live instances of generated web challenges
+instance_supervisor = InstanceSupervisor(
+    CHALLENGES_DIR,
+    warm_per_challenge=int(os.environ.get('CTF_WARM_INSTANCES', 1)),
+    lifetime=int(os.environ.get('CTF_INSTANCE_LIFETIME', 3600)),
+    memory_limit_mb=int(os.environ.get('CTF_INSTANCE_MEMORY_MB', 128)),
+    state_db=os.environ.get('CTF_INSTANCES_DB', str(Path(__file__).parent / 'ctf_instances.db')),
+)
+
+# Ready-made challenges per subtype so /generate does not build inline; CTF_POOL_DEPTH=0 disables it
+challenge_pool = ChallengePool(
+    Path(os.environ.get('CTF_POOL_DIR', str(Path(__file__).parent / 'challenge_pool'))),
+    CHALLENGES_DIR,
+    depth=int(os.environ.get('CTF_POOL_DEPTH', 1)),
+)
+
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Cross-worker invalidation: each worker caches challenge listings and forwards
+# broadcast events to its own live-update stream
+challenge_cache = LocalCache()
+invalidation_bus = InvalidationBus(os.environ.get('CTF_BUS_DB', str(Path(__file__).parent / 'ctf_bus.db')))
+
+def on_challenges_changed(event):
+    challenge_cache.invalidate()
+
+def forward_to_live_updates(event):
+    # Numbered by bus row id, so a browser can resume on any worker
+    event_bus.publish(event['topic'], event['payload'], key=event['key'], seq=event['id'])
+
+for topic in ['challenge_added', 'challenge_submitted', 'challenge_approved', 'challenge_rejected', 'challenge_removed']:
+    # Also run in the publishing worker, so its own redirect after a change is not stale
+    invalidation_bus.subscribe(topic, on_challenges_changed, local=True)
+invalidation_bus.subscribe('*', forward_to_live_updates)
+
+# Every flag attempt, buffered in memory and written in batches off the request path
+submission_log = SubmissionLog(os.environ.get('CTF_SUBMISSIONS_DB', str(Path(__file__).parent / 'ctf_submissions.db')),
+                               log_path=os.environ.get('CTF_SUBMISSIONS_LOG'))
+
+# Fingerprinted static assets built by `python assets.py`
+ASSETS_DIR = Path(__file__).parent / 'static' / 'dist'
+asset_manifest = assets.load_manifest(ASSETS_DIR)
+hashed_assets = set(asset_manifest.values())
+COMPRESS_MIMETYPES = {'text/html', 'application/json'}
+COMPRESS_MIN_SIZE = 1024
+
+def asset_url(filename):
+    """URL of a static file, fingerprinted when the asset build has been run"""
+    if filename in asset_manifest:
+        return url_for('serve_asset', filename=asset_manifest[filename])
+    return url_for('static', filename=filename)
+
+app.jinja_env.globals['asset_url'] = asset_url
+
+# Thumbnails, packet summaries and file heads, rendered on first view and kept by content hash
+preview_cache = previews.PreviewCache(
+    Path(os.environ.get('CTF_PREVIEW_DIR', str(Path(__file__).parent / 'preview_cache'))),
+    max_bytes=int(os.environ.get('CTF_PREVIEW_CACHE_MB', 256)) * 1024 * 1024,
+)
+PREVIEW_WAIT = 5.0
+
+def preview_url(challenge_id, filename, sha256):
+    """URL of a file's preview, versioned by its hash so it can be cached for good; None if unhashed"""
+    if not sha256:
+        return None
+    return url_for('serve_preview', challenge_id=challenge_id, filename=filename, v=sha256[:16])
+
+def prefetch_custom_previews(challenge_id):
+    """Start rendering previews of a custom challenge's uploads in the background"""
+    try:
+        for asset in catalog.get_challenge(challenge_id)['assets']:
+            if asset['sha256']:
+                preview_cache.request(Path(asset['path']), asset['sha256'])
+    except Exception as e:
+        print(f"Error queueing previews for {challenge_id}: {e}")
+
+app.jinja_env.globals['preview_url'] = preview_url
+app.jinja_env.globals['preview_kind'] = previews.preview_kind
+
+# Optional background cleanup of orphaned uploads, e.g. CTF_GC_INTERVAL=3600
+if os.environ.get('CTF_GC_INTERVAL'):
+    LifecycleManager(app.config['UPLOAD_FOLDER']).start(float(os.environ['CTF_GC_INTERVAL']))
+
 def init_database():
     """Initialize the custom challenges database"""
-    conn = sqlite3.connect('ctf_platform.db')
-    cursor = conn.cursor()
-    
-    # Custom challenges table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS custom_challenges (
-            id TEXT PRIMARY KEY,
-            title TEXT NOT NULL,
-            description TEXT NOT NULL,
-            category TEXT NOT NULL,
-            flag TEXT NOT NULL,
-            author TEXT NOT NULL,
-            status TEXT DEFAULT 'pending',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            reviewed_by TEXT,
-            reviewed_at TIMESTAMP,
-            review_notes TEXT
-        )
-    ''')
-    
-    # Challenge files table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS challenge_files (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            challenge_id TEXT,
-            filename TEXT NOT NULL,
-            original_filename TEXT NOT NULL,
-            file_path TEXT NOT NULL,
-            FOREIGN KEY (challenge_id) REFERENCES custom_challenges (id)
-        )
-    ''')
-    
-    # User roles table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_roles (
-            username TEXT PRIMARY KEY,
-            role TEXT DEFAULT 'user'
-        )
-    ''')
+    catalog.init_platform()
     
-    conn.commit()
-    conn.close()
+    # Unified challenge catalog shared by generated and custom challenges
+    catalog.sync_custom()
+    catalog.sync_generated(CHALLENGES_DIR)
 
 # Initialize database on startup
 init_database()
 
 #function to get challenges fro the backend
 def get_challenges():
-    """Get all available challenges from the challenges directory"""
-    challenges_dir = Path(__file__).parent / 'challenges'
-    challenges = []
+    """Get all available generated challenges from the catalog"""
+    solved = session.get('solved_challenges', {})
+    rows = challenge_cache.get_or_load('generated', lambda: catalog.list_challenges('generated'))
     
-    if challenges_dir.exists():
-        for challenge_dir in challenges_dir.iterdir():
-            if challenge_dir.is_dir():
-                challenge_info = {
-                    'id': challenge_dir.name,
-                    'name': challenge_dir.name.replace('_', ' ').title(),
-                    'path': str(challenge_dir),
-                    'solved': session.get('solved_challenges', {}).get(challenge_dir.name, False)
-                }
-                
-                # Try to read README for description
-                readme_path = challenge_dir / 'README.md'
-                if readme_path.exists():
-                    with open(readme_path, 'r') as f:
-                        challenge_info['description'] = f.read()[:200] + '...'
-                else:
-                    challenge_info['description'] = 'No description available'
-                
-                challenges.append(challenge_info)
+    challenges = []
+    for row in rows:
+        challenges.append(GeneratedChallenge(
+            id=row.id,
+            name=row.title,
+            path=str(CHALLENGES_DIR / row.directory),
+            category=row.category,
+            subtype=row.subtype,
+            description=row.description[:200] + '...',
+            solved=solved.get(row.id, False)
+        ))
     
     return challenges
 
+def get_challenge_dir(challenge_id):
+    """Resolve a generated challenge's directory in the sharded layout"""
+    return layout.resolve(CHALLENGES_DIR, challenge_id)
+
+def get_challenge_file(challenge_id, filename):
+    """Resolve a player-visible file of a generated challenge; the catalog says which files those are"""
+    asset = catalog.get_asset(challenge_id, filename)
+    if not asset or asset['source'] != 'generated':
+        return None
+    challenge_dir = get_challenge_dir(challenge_id)
+    return challenge_dir / asset['filename'] if challenge_dir else None
+
 def check_flag(challenge_id, submitted_flag):
     """Check if submitted flag is correct for the challenge"""
-    challenge_dir = Path(__file__).parent / 'challenges' / challenge_id
-    flag_file = challenge_dir / 'flag.txt'
+    challenge_dir = get_challenge_dir(challenge_id)
+    flag_file = challenge_dir / 'flag.txt' if challenge_dir else None
     
-    if flag_file.exists():
+    if flag_file and flag_file.exists():
         with open(flag_file, 'r') as f:
             correct_flag = f.read().strip()
             return submitted_flag.strip() == correct_flag
@@ -123,8 +188,8 @@ def set_user_role(username, role):
     conn.commit()
     conn.close()
 
-def get_custom_challenges(status=None):
-    """Get custom challenges from database"""
+def load_custom_challenges(status=None):
+    """Load custom challenges and their files from database"""
     conn = sqlite3.connect('ctf_platform.db')
     cursor = conn.cursor()
     
@@ -133,32 +198,34 @@ def get_custom_challenges(status=None):
     else:
         cursor.execute('SELECT * FROM custom_challenges ORDER BY created_at DESC')
     
-    challenges = []
-    for row in cursor.fetchall():
-        challenge = {
-            'id': row[0],
-            'title': row[1],
-            'description': row[2],
-            'category': row[3],
-            'flag': row[4],
-            'author': row[5],
-            'status': row[6],
-            'created_at': row[7],
-            'reviewed_by': row[8],
-            'reviewed_at': row[9],
-            'review_notes': row[10],
-            'solved': session.get('solved_challenges', {}).get(f"custom_{row[0]}", False)
-        }
-        
-        # Get associated files
-        cursor.execute('SELECT filename, original_filename FROM challenge_files WHERE challenge_id = ?', (row[0],))
-        challenge['files'] = [{'filename': f[0], 'original_filename': f[1]} for f in cursor.fetchall()]
-        
-        challenges.append(challenge)
+    challenges = CustomChallenge.from_rows(cursor)
+    
+    # Get associated files in one query instead of one per challenge
+    by_id = {challenge.id: challenge for challenge in challenges}
+    query = '''
+        SELECT cf.challenge_id, cf.filename, cf.original_filename, a.sha256 FROM challenge_files cf
+        LEFT JOIN challenge_assets a ON a.challenge_id = cf.challenge_id AND a.filename = cf.filename
+    '''
+    if status:
+        cursor.execute(query + '''
+            WHERE cf.challenge_id IN (SELECT id FROM custom_challenges WHERE status = ?) ORDER BY cf.id
+        ''', (status,))
+    else:
+        cursor.execute(query + ' ORDER BY cf.id')
+    for challenge_id, filename, original_filename, sha256 in cursor.fetchall():
+        if challenge_id in by_id:
+            by_id[challenge_id].files.append(ChallengeFile(filename=filename, original_filename=original_filename,
+                                                           sha256=sha256))
     
     conn.close()
     return challenges
 
+def get_custom_challenges(status=None):
+    """Get custom challenges, cached per worker, with the current user's solves"""
+    solved = session.get('solved_challenges', {})
+    rows = challenge_cache.get_or_load(('custom', status), lambda: load_custom_challenges(status))
+    return [row.replace(solved=solved.get(f"custom_{row.id}", False)) for row in rows]
+
 def save_custom_challenge(title, description, category, flag, author, files):
     """Save a new custom challenge to database"""
     challenge_id = str(uuid.uuid4())
@@ -178,6 +245,7 @@ def save_custom_challenge(title, description, category, flag, author, files):
             VALUES (?, ?, ?, ?)
         ''', (challenge_id, file_info['filename'], file_info['original_filename'], file_info['file_path']))
     
+    catalog.index_custom(cursor, challenge_id, title, description, category, author, files)
     conn.commit()
     conn.close()
     return challenge_id
@@ -191,9 +259,59 @@ def update_challenge_status(challenge_id, status, reviewer, notes=None):
         SET status = ?, reviewed_by = ?, reviewed_at = CURRENT_TIMESTAMP, review_notes = ?
         WHERE id = ?
     ''', (status, reviewer, notes, challenge_id))
+    catalog.set_status(cursor, challenge_id, status)
     conn.commit()
     conn.close()
 
+def bulk_update_challenge_status(challenge_ids, status, reviewer, notes=None, category=None, author=None):
+    """Update the review status of many challenges in one transaction and report per id
+    
+    Without ids, every pending challenge matching the category/author filters is updated.
+    """
+    conn = sqlite3.connect('ctf_platform.db')
+    cursor = conn.cursor()
+    
+    filters = []
+    params = []
+    if category:
+        filters.append('category = ?')
+        params.append(category)
+    if author:
+        filters.append('author = ?')
+        params.append(author)
+    
+    results = {}
+    matched = []
+    if challenge_ids:
+        results = {challenge_id: 'not_found' for challenge_id in challenge_ids}
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(challenge_ids), 500):
+            chunk = challenge_ids[start:start + 500]
+            placeholders = ', '.join('?' for _ in chunk)
+            cursor.execute(f'SELECT id, category, author FROM custom_challenges WHERE id IN ({placeholders})', chunk)
+            for challenge_id, row_category, row_author in cursor.fetchall():
+                if (category and row_category != category) or (author and row_author != author):
+                    results[challenge_id] = 'filtered_out'
+                else:
+                    matched.append(challenge_id)
+    else:
+        where = ' AND '.join(["status = 'pending'"] + filters)
+        cursor.execute(f'SELECT id FROM custom_challenges WHERE {where}', params)
+        matched = [row[0] for row in cursor.fetchall()]
+    
+    cursor.executemany('''
+        UPDATE custom_challenges 
+        SET status = ?, reviewed_by = ?, reviewed_at = CURRENT_TIMESTAMP, review_notes = ?
+        WHERE id = ?
+    ''', [(status, reviewer, notes, challenge_id) for challenge_id in matched])
+    catalog.set_statuses(cursor, matched, status)
+    conn.commit()
+    conn.close()
+    
+    for challenge_id in matched:
+        results[challenge_id] = status
+    return results
+
 def check_custom_flag(challenge_id, submitted_flag):
     """Check if submitted flag is correct for custom challenge"""
     conn = sqlite3.connect('ctf_platform.db')
@@ -205,42 +323,62 @@ def check_custom_flag(challenge_id, submitted_flag):
     if result:
         return submitted_flag.strip() == result[0].strip()
     return False
-    """Get all available challenges from the challenges directory"""
-    challenges_dir = Path(__file__).parent / 'challenges'
-    challenges = []
-    
-    if challenges_dir.exists():
-        for challenge_dir in challenges_dir.iterdir():
-            if challenge_dir.is_dir():
-                challenge_info = {
-                    'id': challenge_dir.name,
-                    'name': challenge_dir.name.replace('_', ' ').title(),
-                    'path': str(challenge_dir),
-                    'solved': session.get('solved_challenges', {}).get(challenge_dir.name, False)
-                }
-                
-                # Try to read README for description
-                readme_path = challenge_dir / 'README.md'
-                if readme_path.exists():
-                    with open(readme_path, 'r') as f:
-                        challenge_info['description'] = f.read()[:200] + '...'
-                else:
-                    challenge_info['description'] = 'No description available'
-                
-                challenges.append(challenge_info)
-    
-    return challenges
 
-def check_flag(challenge_id, submitted_flag):
-    """Check if submitted flag is correct for the challenge"""
-    challenge_dir = Path(__file__).parent / 'challenges' / challenge_id
-    flag_file = challenge_dir / 'flag.txt'
-    
-    if flag_file.exists():
-        with open(flag_file, 'r') as f:
-            correct_flag = f.read().strip()
-            return submitted_flag.strip() == correct_flag
-    return False
+@app.before_request
+def start_invalidation_bus():
+    # Started lazily so every forked worker runs its own poller and flusher
+    invalidation_bus.start()
+    submission_log.start()
+    challenge_pool.start()
+
+@app.after_request
+def compress_response(response):
+    """Compress HTML and JSON bodies above a size threshold"""
+    if (response.mimetype not in COMPRESS_MIMETYPES or response.status_code != 200
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    
+    for encoding in assets.accepted_encodings(request.headers.get('Accept-Encoding', '')):
+        if encoding == 'br' and assets.brotli is None:
+            continue
+        # Per-request compression trades a little CPU for much less transfer; keep it cheap
+        if encoding == 'br':
+            packed = assets.brotli.compress(data, quality=4)
+        else:
+            packed = gzip.compress(data, compresslevel=6)
+        response.set_data(packed)
+        response.headers['Content-Encoding'] = encoding
+        break
+    return response
+
+@app.route('/assets/<path:filename>')
+def serve_asset(filename):
+    if filename not in hashed_assets:
+        return 'Not found', 404
+    
+    file_path = ASSETS_DIR / filename
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = None
+    for candidate in assets.accepted_encodings(request.headers.get('Accept-Encoding', '')):
+        suffix = '.br' if candidate == 'br' else '.gz'
+        if (ASSETS_DIR / (filename + suffix)).exists():
+            file_path = ASSETS_DIR / (filename + suffix)
+            encoding = candidate
+            break
+    
+    response = send_file(file_path, mimetype=mimetype, conditional=True, etag=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # The name changes whenever the content does, so clients never need to revalidate
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
 
 @app.route('/', methods=['GET'])
 def index():
@@ -297,30 +435,46 @@ def view_challenge(challenge_id):
     if 'user' not in session:
         return redirect(url_for('index'))
     
-    challenge_dir = Path(__file__).parent / 'challenges' / challenge_id
-    if not challenge_dir.exists():
+    row = catalog.get_challenge(challenge_id)
+    if not row or row['source'] != 'generated':
         flash('Challenge not found', 'error')
         return redirect(url_for('index'))
     
-    challenge_info = {
-        'id': challenge_id,
-        'name': challenge_id.replace('_', ' ').title(),
-        'solved': session.get('solved_challenges', {}).get(challenge_id, False)
-    }
-    
-    # Read README
-    readme_path = challenge_dir / 'README.md'
-    if readme_path.exists():
-        with open(readme_path, 'r') as f:
-            challenge_info['description'] = f.read()
-    
     # List available files
-    challenge_info['files'] = []
-    for file_path in challenge_dir.iterdir():
-        if file_path.is_file() and file_path.name not in ['flag.txt', 'SOLUTION.md']:
-            challenge_info['files'].append(file_path.name)
+    files = [asset['filename'] for asset in row['assets']]
+    challenge_info = GeneratedChallenge(
+        id=challenge_id,
+        name=row['title'],
+        path=str(get_challenge_dir(challenge_id)),
+        category=row['category'],
+        subtype=row['subtype'],
+        description=row['description'],
+        files=files,
+        live=instance_supervisor.challenge_app(challenge_id) is not None,
+        solved=session.get('solved_challenges', {}).get(challenge_id, False)
+    )
+    
+    file_hashes = {asset['filename']: asset['sha256'] for asset in row['assets']}
+    return render_template('challenge.html', challenge=challenge_info, file_hashes=file_hashes)
+
+def record_flag_attempt(user, challenge_id, challenge_type, submitted_flag):
+    """Check and log one flag submission; returns (correct, key of the challenge in the session)"""
+    if not challenge_id or not submitted_flag:
+        raise ValueError('Missing challenge or flag')
+    if challenge_type == 'custom':
+        is_correct = check_custom_flag(challenge_id, submitted_flag)
+        session_key = f"custom_{challenge_id}"
+    else:
+        is_correct = check_flag(challenge_id, submitted_flag)
+        session_key = challenge_id
+    
+    submission_log.record(user, challenge_id, challenge_type, is_correct)
     
-    return render_template('challenge.html', challenge=challenge_info)
+    if is_correct:
+        invalidation_bus.publish('solve_recorded', {'user': user, 'challenge_id': challenge_id,
+                                                    'challenge_type': challenge_type},
+                                 key=f"{user}:{session_key}")
+    return is_correct, session_key
 
 @app.route('/submit_flag', methods=['POST'])
 def submit_flag():
@@ -330,13 +484,10 @@ def submit_flag():
     challenge_id = request.form.get('challenge_id')
     challenge_type = request.form.get('challenge_type', 'generated')
     submitted_flag = request.form.get('flag')
+    if not challenge_id or not submitted_flag:
+        return jsonify({'success': False, 'message': 'Missing challenge or flag'})
     
-    if challenge_type == 'custom':
-        is_correct = check_custom_flag(challenge_id, submitted_flag)
-        session_key = f"custom_{challenge_id}"
-    else:
-        is_correct = check_flag(challenge_id, submitted_flag)
-        session_key = challenge_id
+    is_correct, session_key = record_flag_attempt(session['user'], challenge_id, challenge_type, submitted_flag)
     
     if is_correct:
         # Mark challenge as solved
@@ -383,9 +534,16 @@ def create_custom_challenge():
         
         try:
             challenge_id = save_custom_challenge(title, description, category, flag, session['user'], uploaded_files)
+            invalidation_bus.publish('challenge_submitted', {'id': challenge_id}, key=challenge_id)
+            # Render previews now so they are ready by the time a reviewer opens the queue
+            prefetch_custom_previews(challenge_id)
             flash(f'Challenge "{title}" submitted for review!', 'success')
             return redirect(url_for('index'))
         except Exception as e:
+            # The uploads were saved before the insert; don't leave them behind
+            for file_info in uploaded_files:
+                if os.path.exists(file_info['file_path']):
+                    os.remove(file_info['file_path'])
             flash(f'Error creating challenge: {str(e)}', 'error')
     
     return render_template('create_custom.html')
@@ -430,10 +588,51 @@ def review_action():
         # Convert action to past tense properly
         status = 'approved' if action == 'approve' else 'rejected'
         update_challenge_status(challenge_id, status, session['user'], notes)
+        invalidation_bus.publish(f'challenge_{status}', {'id': challenge_id, 'status': status}, key=challenge_id)
         return jsonify({'success': True, 'message': f'Challenge {status} successfully'})
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error: {str(e)}'})
 
+@app.route('/review_bulk', methods=['POST'])
+def review_bulk():
+    if 'user' not in session:
+        return jsonify({'success': False, 'message': 'Not logged in'})
+    
+    user_role = get_user_role(session['user'])
+    if user_role != 'admin':
+        return jsonify({'success': False, 'message': 'Access denied'})
+    
+    data = request.get_json(silent=True) or request.form
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'message': 'Expected a JSON object'})
+    challenge_ids = data.get('challenge_ids', []) if request.is_json else request.form.getlist('challenge_ids')
+    if not isinstance(challenge_ids, list) or not all(isinstance(cid, str) for cid in challenge_ids):
+        return jsonify({'success': False, 'message': 'challenge_ids must be a list of strings'})
+    action = data.get('action')
+    notes = data.get('notes', '')
+    category = data.get('category') or None
+    author = data.get('author') or None
+    
+    if action not in ['approve', 'reject']:
+        return jsonify({'success': False, 'message': 'Invalid action'})
+    
+    if not challenge_ids and not (category or author):
+        return jsonify({'success': False, 'message': 'Select challenges or give a category/author filter'})
+    
+    try:
+        status = 'approved' if action == 'approve' else 'rejected'
+        results = bulk_update_challenge_status(list(dict.fromkeys(challenge_ids)), status, session['user'],
+                                               notes, category, author)
+        updated = [challenge_id for challenge_id, result in results.items() if result == status]
+        if updated:
+            # One broadcast per batch refreshes every worker's caches once
+            invalidation_bus.publish(f'challenge_{status}', {'ids': updated, 'status': status})
+        return jsonify({'success': True,
+                        'message': f'{len(updated)} challenge(s) {status}',
+                        'results': results})
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+
 @app.route('/custom_challenge/<challenge_id>')
 def view_custom_challenge(challenge_id):
     if 'user' not in session:
@@ -442,33 +641,31 @@ def view_custom_challenge(challenge_id):
     conn = sqlite3.connect('ctf_platform.db')
     cursor = conn.cursor()
     cursor.execute('SELECT * FROM custom_challenges WHERE id = ? AND status = "approved"', (challenge_id,))
-    result = cursor.fetchone()
+    result = CustomChallenge.from_rows(cursor)
     
     if not result:
+        conn.close()
         flash('Challenge not found or not approved', 'error')
         return redirect(url_for('index'))
     
-    challenge = {
-        'id': result[0],
-        'title': result[1],
-        'description': result[2],
-        'category': result[3],
-        'author': result[5],
-        'solved': session.get('solved_challenges', {}).get(f"custom_{result[0]}", False)
-    }
+    challenge = result[0]
+    # The flag stays on the server
+    challenge.flag = None
+    challenge.solved = session.get('solved_challenges', {}).get(f"custom_{challenge.id}", False)
     
     # Get associated files
-    cursor.execute('SELECT filename, original_filename FROM challenge_files WHERE challenge_id = ?', (challenge_id,))
-    challenge['files'] = [{'filename': f[0], 'original_filename': f[1]} for f in cursor.fetchall()]
+    cursor.execute('''
+        SELECT cf.filename, cf.original_filename, a.sha256 FROM challenge_files cf
+        LEFT JOIN challenge_assets a ON a.challenge_id = cf.challenge_id AND a.filename = cf.filename
+        WHERE cf.challenge_id = ?
+    ''', (challenge_id,))
+    challenge.files = ChallengeFile.from_rows(cursor)
     
     conn.close()
     return render_template('custom_challenge.html', challenge=challenge)
 
-@app.route('/custom_file/<challenge_id>/<filename>')
-def serve_custom_file(challenge_id, filename):
-    if 'user' not in session:
-        return redirect(url_for('index'))
-    
+def get_custom_file(challenge_id, filename):
+    """(file_path, original_filename) of a file attached to an approved custom challenge, or None"""
     conn = sqlite3.connect('ctf_platform.db')
     cursor = conn.cursor()
     cursor.execute('''
@@ -479,6 +676,14 @@ def serve_custom_file(challenge_id, filename):
     ''', (challenge_id, filename))
     result = cursor.fetchone()
     conn.close()
+    return result
+
+@app.route('/custom_file/<challenge_id>/<filename>')
+def serve_custom_file(challenge_id, filename):
+    if 'user' not in session:
+        return redirect(url_for('index'))
+    
+    result = get_custom_file(challenge_id, filename)
     
     if not result:
         flash('File not found', 'error')
@@ -491,6 +696,11 @@ def serve_custom_file(challenge_id, filename):
         flash(f'Error serving file: {str(e)}', 'error')
         return redirect(url_for('view_custom_challenge', challenge_id=challenge_id))
 
+def generate_subtypes():
+    """Subtypes offered on the generate form, per family"""
+    return {family.name.lower(): [subtype.name.lower() for subtype in subtypes]
+            for family, subtypes in SUBTYPES.items()}
+
 @app.route('/generate', methods=['GET', 'POST'])
 def generate_challenge():
     if 'user' not in session:
@@ -498,38 +708,51 @@ def generate_challenge():
     
     if request.method == 'POST':
         challenge_type = request.form.get('type')
+        subtype = request.form.get('subtype') or None
+        
+        if challenge_type not in ['web', 'crypto', 'forensics']:
+            flash('Please select a valid challenge type', 'error')
+            return render_template('generate.html', subtypes=generate_subtypes())
+        
+        family = ChallengeType[challenge_type.upper()]
+        if subtype and subtype.upper() not in SUBTYPES[family].__members__:
+            flash('Please select a valid challenge subtype', 'error')
+            return render_template('generate.html', subtypes=generate_subtypes())
         
         try:
-            # Use existing challenge generator
-            challenge_dir = challenge_gen.create_challenge_directory('./challenges')
-            flag = challenge_gen.generate_flag()
-            challenge_gen.save_flag(challenge_dir, flag)
+            # Hand out a pre-built challenge; build inline only when the pool is empty
+            challenge_dir = challenge_pool.claim(challenge_type, subtype.lower() if subtype else None)
+            manifest = None
+            if challenge_dir is None:
+                challenge_info = challenge_gen.generate_challenge(
+                    family, CHALLENGES_DIR, SUBTYPES[family][subtype.upper()] if subtype else None)
+                challenge_dir = Path(challenge_info['directory'])
+                manifest = challenge_info['manifest']
             
-            if challenge_type == 'web':
-                challenge_gen.generate_web_challenge(challenge_dir, flag)
-            elif challenge_type == 'crypto':
-                challenge_gen.generate_crypto_challenge(challenge_dir, flag)
-            elif challenge_type == 'forensics':
-                challenge_gen.generate_forensics_challenge(challenge_dir, flag)
+            conn = sqlite3.connect('ctf_platform.db')
+            catalog.index_generated(conn.cursor(), CHALLENGES_DIR, challenge_dir, manifest)
+            conn.commit()
+            conn.close()
             
+            invalidation_bus.publish('challenge_added', {'id': challenge_dir.name, 'category': challenge_type},
+                                     key=challenge_dir.name)
             flash(f'Challenge generated successfully! ID: {challenge_dir.name}', 'success')
             return redirect(url_for('index'))
             
         except Exception as e:
             flash(f'Error generating challenge: {str(e)}', 'error')
     
-    return render_template('generate.html')
+    return render_template('generate.html', subtypes=generate_subtypes())
 
 @app.route('/file/<challenge_id>/<filename>')
 def serve_challenge_file(challenge_id, filename):
     if 'user' not in session:
         return redirect(url_for('index'))
     
-    challenge_dir = Path(__file__).parent / 'challenges' / challenge_id
-    file_path = challenge_dir / filename
+    # Only catalogued files are served, which keeps flag.txt and SOLUTION.md private
+    file_path = get_challenge_file(challenge_id, filename)
     
-    # Security check - prevent access to flag.txt and solution files
-    if filename in ['flag.txt', 'SOLUTION.md'] or not file_path.exists():
+    if not file_path or not file_path.exists():
         flash('File not accessible', 'error')
         return redirect(url_for('view_challenge', challenge_id=challenge_id))
     
@@ -544,21 +767,124 @@ def serve_challenge_file(challenge_id, filename):
         except:
             return 'Error reading file'
 
+@app.route('/preview/<challenge_id>/<filename>')
+def serve_preview(challenge_id, filename):
+    if 'user' not in session:
+        return redirect(url_for('index'))
+    
+    asset = catalog.get_asset(challenge_id, filename)
+    if not asset or not asset['sha256']:
+        return 'Not found', 404
+    if asset['source'] == 'generated':
+        challenge_dir = get_challenge_dir(challenge_id)
+        file_path = challenge_dir / asset['filename'] if challenge_dir else None
+    elif asset['status'] == 'approved' or get_user_role(session['user']) == 'admin':
+        # Reviewers preview uploads before they are approved
+        file_path = Path(asset['path'])
+    else:
+        return 'Not found', 404
+    if not file_path or not file_path.exists():
+        return 'Not found', 404
+    
+    preview_path = preview_cache.get(file_path, asset['sha256'], wait=PREVIEW_WAIT)
+    if preview_path is None:
+        return 'Preview is still being generated', 503, {'Retry-After': '2'}
+    
+    response = send_file(preview_path, mimetype=previews.preview_mimetype(preview_path),
+                         conditional=True, etag=preview_path.name)
+    if request.args.get('v') == asset['sha256'][:16]:
+        # The URL names the file's hash, so the preview behind it never changes
+        response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 @app.route('/download/<challenge_id>/<filename>')
 def download_challenge_file(challenge_id, filename):
     if 'user' not in session:
         return redirect(url_for('index'))
     
-    from flask import send_file
-    challenge_dir = Path(__file__).parent / 'challenges' / challenge_id
-    file_path = challenge_dir / filename
+    file_path = get_challenge_file(challenge_id, filename)
     
-    if filename not in ['flag.txt', 'SOLUTION.md'] and file_path.exists():
+    if file_path and file_path.exists():
         return send_file(file_path, as_attachment=True)
     
     flash('File not found or not accessible', 'error')
     return redirect(url_for('view_challenge', challenge_id=challenge_id))
 
+# Seconds an /events stream stays open before the browser is made to reconnect; 0 keeps it open
+EVENTS_LIFETIME = float(os.environ.get('CTF_EVENTS_LIFETIME', 30))
+
+@app.route('/events')
+def event_stream():
+    if 'user' not in session:
+        return jsonify({'success': False, 'message': 'Not logged in'}), 401
+    
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    latest = invalidation_bus.latest_id()
+    replay = []
+    if last_event_id.isdigit():
+        # Ids are bus row ids, so whatever this worker has not seen yet is read back from the bus;
+        # an id ahead of the bus comes from before it was reset
+        since = min(int(last_event_id), latest)
+        replay = invalidation_bus.replay(since)
+    else:
+        since = latest
+    
+    # Each open stream holds a worker, so it ends after EVENTS_LIFETIME and the browser reconnects;
+    # under gevent workers set CTF_EVENTS_LIFETIME=0 to keep streams open
+    return Response(stream_with_context(event_bus.stream(since, lifetime=EVENTS_LIFETIME, replay=replay,
+                                                         gap=replay is None)),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/instance/<challenge_id>')
+def launch_instance(challenge_id):
+    if 'user' not in session:
+        return redirect(url_for('index'))
+    
+    if instance_supervisor.challenge_app(challenge_id) is None:
+        flash('This challenge has no live instance', 'error')
+        return redirect(url_for('view_challenge', challenge_id=challenge_id))
+    
+    try:
+        instance_supervisor.start()
+        instance = instance_supervisor.claim(challenge_id, session['user'])
+    except (OSError, RuntimeError) as e:
+        flash(f'Error starting instance: {str(e)}', 'error')
+        return redirect(url_for('view_challenge', challenge_id=challenge_id))
+    
+    host = os.environ.get('CTF_INSTANCE_HOST', request.host.split(':')[0])
+    return redirect(f'http://{host}:{instance.port}/')
+
+@app.route('/instances')
+def instance_health():
+    if 'user' not in session or get_user_role(session['user']) != 'admin':
+        return jsonify({'success': False, 'message': 'Access denied'})
+    
+    return jsonify({'success': True, 'instances': instance_supervisor.health()})
+
+@app.route('/admin/analytics')
+def submission_analytics():
+    if 'user' not in session or get_user_role(session['user']) != 'admin':
+        return jsonify({'success': False, 'message': 'Access denied'})
+    
+    min_failures = request.args.get('min_failures', 50, type=int)
+    return jsonify({'success': True,
+                    'challenges': submissions.challenge_stats(submission_log.db_path),
+                    'suspected_bruteforce': submissions.suspected_bruteforce(min_failures, submission_log.db_path),
+                    'buffered': submission_log.pending,
+                    'dropped': submission_log.dropped,
+                    'rejected': submission_log.rejected})
+
+@app.route('/admin/analytics/<challenge_id>')
+def challenge_solve_curve(challenge_id):
+    if 'user' not in session or get_user_role(session['user']) != 'admin':
+        return jsonify({'success': False, 'message': 'Access denied'})
+    
+    return jsonify({'success': True, 'challenge_id': challenge_id,
+                    'curve': submissions.solve_curve(challenge_id, submission_log.db_path)})
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host="0.0.0.0", port=port, debug=False)